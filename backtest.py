@@ -0,0 +1,193 @@
+# -----------------------------------------------------------------------------------------------------
+# ------------------------------------  Model Backtest  -----------------------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Predicts the stored feature rows in [start, end) with a registered model and scores
+# the predictions against the stored aqi: MAE and RMSE overall, per day of week and per
+# calendar month. The range is read and predicted one window of BACKTEST_WINDOW_DAYS at
+# a time and the scores are kept as running sums, so memory stays bounded for years of
+# hourly rows. Rows come from the feature store, or with --source cache from the local
+# training cache Parquet written by training_pipeline.py. The backend serves the same
+# thing as GET /backtest.
+#
+# Example:
+#   python backtest.py --start 2024-01-01 --end 2025-02-01 --output backtest.ndjson
+
+import argparse
+import json
+import math
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+from feature_store import FEATURE_GROUP, get_store
+from features import DATE_FORMAT, FEATURE_COLUMNS, feature_matrix
+from forest_export import FOREST_DIR, load_forest
+from inference_artifact import ARTIFACT_FILE, LEGACY_MODEL_FILE, load_artifact
+from instrumentation import print_summary_at_exit, timed
+from training_cache import TRAINING_CACHE_DIR, TRAINING_CACHE_FILE
+
+BACKTEST_SOURCE = os.getenv("BACKTEST_SOURCE", "store")  # store or cache
+BACKTEST_WINDOW_DAYS = int(os.getenv("BACKTEST_WINDOW_DAYS", 31))
+
+# Range backtested when no start is given: the backfilled history
+BACKTEST_DEFAULT_DAYS = int(os.getenv("BACKTEST_DEFAULT_DAYS", 400))
+
+MODEL_NAME = "random_forest"
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join("webapp", "backend", "model_cache"))
+
+PREDICTION_COLUMNS = ["readable_time", "aqi", "predicted_aqi"]
+
+
+# Defaults and validation shared by the CLI and the endpoint; dates are YYYY-MM-DD
+def backtest_range(start=None, end=None):
+    try:
+        end_date = datetime.strptime(end, DATE_FORMAT) if end else datetime.now() + timedelta(days=1)
+        start_date = datetime.strptime(start, DATE_FORMAT) if start else end_date - timedelta(days=BACKTEST_DEFAULT_DAYS)
+    except ValueError:
+        raise ValueError("start and end must be dates in YYYY-MM-DD format.")
+    if start_date >= end_date:
+        raise ValueError("start must be before end.")
+    return start_date.strftime(DATE_FORMAT), end_date.strftime(DATE_FORMAT)
+
+
+def windows(start, end, window_days=BACKTEST_WINDOW_DAYS):
+    window_start = datetime.strptime(start, DATE_FORMAT)
+    end_date = datetime.strptime(end, DATE_FORMAT)
+    while window_start < end_date:
+        window_end = min(window_start + timedelta(days=window_days), end_date)
+        yield window_start.strftime(DATE_FORMAT), window_end.strftime(DATE_FORMAT)
+        window_start = window_end
+
+
+# readable_time is a date or a timestamp string, so [start, end) compares as text
+def read_window(store, start, end, source=BACKTEST_SOURCE):
+    with timed("backtest_read_seconds", source=source):
+        if source == "cache":
+            path = os.path.join(TRAINING_CACHE_DIR, TRAINING_CACHE_FILE)
+            return pd.read_parquet(path, filters=[("readable_time", ">=", start), ("readable_time", "<", end)])
+        if source == "store":
+            return store.read_range(FEATURE_GROUP, start=start, end=end)
+    raise ValueError(f"Unknown BACKTEST_SOURCE {source!r}, expected 'store' or 'cache'")
+
+
+# Frames of PREDICTION_COLUMNS, one per window that has rows
+def predict_range(store, model, start, end, source=BACKTEST_SOURCE, window_days=BACKTEST_WINDOW_DAYS):
+    for window_start, window_end in windows(start, end, window_days):
+        frame = read_window(store, window_start, window_end, source)
+        # A missing feature group reads as a frame without columns
+        if frame.empty:
+            continue
+        frame = frame.dropna(subset=FEATURE_COLUMNS + ["aqi"])
+        if frame.empty:
+            continue
+        with timed("backtest_predict_seconds"):
+            frame = frame.sort_values("readable_time", ignore_index=True)
+            frame["predicted_aqi"] = model.predict(feature_matrix(frame))
+        yield frame[PREDICTION_COLUMNS]
+
+
+class BacktestScores:
+    def __init__(self):
+        self._sums = {}  # (grouping, key) -> [rows, sum of |error|, sum of error^2]
+
+    def update(self, frame):
+        error = frame["predicted_aqi"] - frame["aqi"].astype(float)
+        times = pd.to_datetime(frame["readable_time"])
+        errors = pd.DataFrame({
+            "overall": "all",
+            "day_of_week": times.dt.day_name(),
+            "month": times.dt.strftime("%Y-%m"),
+            "abs": error.abs(),
+            "sq": error ** 2,
+        })
+        for grouping in ("overall", "day_of_week", "month"):
+            sums = errors.groupby(grouping)[["abs", "sq"]].agg(["count", "sum"])
+            for key, row in sums.iterrows():
+                total = self._sums.setdefault((grouping, key), [0, 0.0, 0.0])
+                total[0] += int(row[("abs", "count")])
+                total[1] += row[("abs", "sum")]
+                total[2] += row[("sq", "sum")]
+
+    @staticmethod
+    def _score(rows, abs_sum, sq_sum):
+        return {"rows": rows, "mae": round(abs_sum / rows, 4), "rmse": round(math.sqrt(sq_sum / rows), 4)}
+
+    def report(self):
+        report = {"overall": None, "day_of_week": {}, "month": {}}
+        for (grouping, key), totals in sorted(self._sums.items()):
+            if grouping == "overall":
+                report["overall"] = self._score(*totals)
+            else:
+                report[grouping][key] = self._score(*totals)
+        # Monday first rather than alphabetical
+        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        report["day_of_week"] = {day: report["day_of_week"][day] for day in days if day in report["day_of_week"]}
+        return report
+
+
+# NDJSON lines: every prediction, then one {"scores": ...} line for the whole range
+def backtest_lines(store, model, start, end, source=BACKTEST_SOURCE, model_version=None):
+    scores = BacktestScores()
+    for frame in predict_range(store, model, start, end, source):
+        scores.update(frame)
+        yield frame.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+    summary = {"start": start, "end": end, "model_version": model_version, "scores": scores.report()}
+    yield json.dumps(summary) + "\n"
+
+
+def load_model(store, model_name=MODEL_NAME, version=None):
+    version = version or store.latest_model_version(model_name)
+    model_dir = store.model_dir(model_name, version, MODEL_CACHE_DIR)
+    for name in (FOREST_DIR, ARTIFACT_FILE, LEGACY_MODEL_FILE):
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            continue
+        if name == FOREST_DIR:
+            return version, load_forest(path, expected_columns=FEATURE_COLUMNS)
+        return version, load_artifact(path, expected_columns=FEATURE_COLUMNS)
+    raise FileNotFoundError(f"No model file found in {model_dir}")
+
+
+def print_report(report):
+    overall = report["overall"]
+    if overall is None:
+        print("No rows with features and aqi in the range.")
+        return
+    print(f"Overall: rows={overall['rows']} MAE={overall['mae']} RMSE={overall['rmse']}")
+    for grouping in ("day_of_week", "month"):
+        print(f"By {grouping.replace('_', ' ')}:")
+        for key, score in report[grouping].items():
+            print(f"  {key:<10} rows={score['rows']:<6} MAE={score['mae']:<8} RMSE={score['rmse']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest a registered model over the stored feature data.")
+    parser.add_argument("--start", help=f"first day, YYYY-MM-DD (default: {BACKTEST_DEFAULT_DAYS} days before --end)")
+    parser.add_argument("--end", help="day after the last one, YYYY-MM-DD (default: tomorrow)")
+    parser.add_argument("--source", default=BACKTEST_SOURCE, choices=["store", "cache"],
+                        help="feature store, or the local training cache Parquet")
+    parser.add_argument("--model-version", type=int, help="registry version (default: latest)")
+    parser.add_argument("--output", help="write the predictions and scores to this NDJSON file")
+    parser.add_argument("--json", help="write the scores to this file")
+    args = parser.parse_args()
+
+    print_summary_at_exit("backtest")
+    start, end = backtest_range(args.start, args.end)
+    store = get_store()
+    model_version, model = load_model(store, version=args.model_version)
+    print(f"Backtesting {MODEL_NAME} version {model_version} on [{start}, {end}) from the {args.source}")
+
+    output = open(args.output, "w") if args.output else None
+    try:
+        for line in backtest_lines(store, model, start, end, args.source, model_version):
+            if output is not None:
+                output.write(line)
+    finally:
+        if output is not None:
+            output.close()
+
+    summary = json.loads(line)
+    print_report(summary["scores"])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,142 @@
+# -----------------------------------------------------------------------------------------------------
+# ----------------------------  Micro-Batching Throughput Benchmark  ----------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Drives model.predict the way concurrent /predict requests do (a few feature rows each,
+# on one event loop) with and without the backend's PredictionBatcher, and reports
+# throughput, latency percentiles and the mean batch size at several concurrency levels,
+# for the pickled artifact and the memory-mapped forest export.
+#
+# Without --artifact a forest is trained on synthetic data in the FEATURE_COLUMNS layout.
+#
+# Example:
+#   python benchmarks/bench_batching.py --concurrency 1 8 32 128 --max-wait-ms 1 2 5
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "webapp", "backend"))
+
+from features import FEATURE_COLUMNS
+from inference_artifact import load_artifact
+from forest_export import export_forest, load_forest
+from prediction_batcher import PredictionBatcher
+from bench_model_format import synthetic_artifact
+
+
+async def drive(predict, frames, concurrency):
+    latencies = []
+    remaining = iter(frames)
+
+    async def worker():
+        for frame in remaining:
+            start = time.perf_counter()
+            await predict(frame)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_level(model, frames, concurrency, max_wait_ms, max_batch_rows, warmup):
+    if max_wait_ms is None:
+        async def predict(frame):
+            return await asyncio.to_thread(model.predict, frame)
+        batcher = None
+    else:
+        batcher = PredictionBatcher(max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms)
+        batcher.start()
+
+        async def predict(frame):
+            return await batcher.predict(model, frame)
+
+    try:
+        await drive(predict, frames[:warmup], concurrency)
+        if batcher is not None:
+            batcher.batches = batcher.requests = batcher.rows = 0
+        latencies, elapsed = await drive(predict, frames[warmup:], concurrency)
+    finally:
+        if batcher is not None:
+            await batcher.stop()
+
+    latencies = np.array(latencies)
+    return {
+        "concurrency": concurrency,
+        "batching": "off" if batcher is None else f"{max_wait_ms}ms",
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_requests_per_batch": batcher.stats()["mean_requests_per_batch"] if batcher else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched predict against one predict per request.")
+    parser.add_argument("--artifact", help="pickled inference artifact or legacy rf_model.pkl (default: synthetic)")
+    parser.add_argument("--trees", type=int, default=300, help="trees in the synthetic forest")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in the synthetic training set")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per run")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests before each run")
+    parser.add_argument("--rows-per-request", type=int, default=3, help="feature rows per request (3 daily rows)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[1, 2], help="batcher wait windows to compare")
+    parser.add_argument("--max-batch-rows", type=int, default=1024)
+    parser.add_argument("--formats", nargs="+", default=["pickle", "forest"], choices=["pickle", "forest"])
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if args.artifact:
+        artifact = load_artifact(args.artifact, expected_columns=FEATURE_COLUMNS)
+    else:
+        print(f"Training a {args.trees}-tree forest on {args.rows} synthetic rows")
+        artifact = synthetic_artifact(args.trees, args.rows)
+
+    rng = np.random.default_rng(0)
+    total = args.warmup + args.requests
+    frames = [
+        pd.DataFrame(rng.normal(size=(args.rows_per_request, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+        for _ in range(total)
+    ]
+
+    workdir = tempfile.mkdtemp(prefix="aqi-batching-")
+    results = []
+    try:
+        models = {}
+        if "pickle" in args.formats:
+            models["pickle"] = artifact
+        if "forest" in args.formats:
+            models["forest"] = load_forest(export_forest(artifact, os.path.join(workdir, "forest")), mmap=True)
+
+        for fmt, model in models.items():
+            for concurrency in args.concurrency:
+                for max_wait_ms in [None] + args.max_wait_ms:
+                    result = asyncio.run(
+                        run_level(model, frames, concurrency, max_wait_ms, args.max_batch_rows, args.warmup)
+                    )
+                    result["format"] = fmt
+                    results.append(result)
+                    print(f"{fmt:<7} concurrency={concurrency:<4} batching={result['batching']:<6} "
+                          f"rps={result['throughput_rps']:<9} p50={result['p50_ms']:.2f}ms "
+                          f"p99={result['p99_ms']:.2f}ms requests/batch={result['mean_requests_per_batch']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows_per_request": args.rows_per_request, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# -----------------------------------------------------------------------------------------------------
+# ------------------------  Model Format Benchmark: joblib vs. Flat Forest  ---------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Compares the pickled inference artifact (joblib.load) with the compact forest export
+# (forest_export.load_forest, memory-mapped) on load time, resident memory after load
+# and after a first predict, and predict latency at several batch sizes. Every load is
+# measured in a fresh subprocess so nothing is already imported or paged in.
+#
+# Without --artifact a forest is trained on synthetic data in the FEATURE_COLUMNS layout.
+#
+# Example:
+#   python benchmarks/bench_model_format.py --trees 1000 --batch-sizes 3 100 10000
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from features import FEATURE_COLUMNS
+from inference_artifact import ARTIFACT_FILE, InferenceArtifact, load_artifact
+from forest_export import FOREST_DIR, export_forest, load_forest
+
+# Runs inside the measuring subprocess: argv = format, path, batch sizes (JSON), repeats
+MEASURE_SCRIPT = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+import numpy as np
+import pandas as pd
+from features import FEATURE_COLUMNS
+base_rss = rss_mb()
+
+fmt, path, batch_sizes, repeats = sys.argv[1], sys.argv[2], json.loads(sys.argv[3]), int(sys.argv[4])
+start = time.perf_counter()
+if fmt == "joblib":
+    from inference_artifact import load_artifact
+    artifact = load_artifact(path, expected_columns=FEATURE_COLUMNS)
+else:
+    from forest_export import load_forest
+    artifact = load_forest(path, mmap=True, expected_columns=FEATURE_COLUMNS)
+load_ms = (time.perf_counter() - start) * 1000
+load_rss = rss_mb()
+
+rng = np.random.default_rng(0)
+frames = {{n: pd.DataFrame(rng.random((n, len(FEATURE_COLUMNS))) * 100, columns=FEATURE_COLUMNS) for n in batch_sizes}}
+
+start = time.perf_counter()
+artifact.predict(frames[batch_sizes[0]])
+first_predict_ms = (time.perf_counter() - start) * 1000
+predict_rss = rss_mb()
+
+latency = {{}}
+for n, frame in frames.items():
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        artifact.predict(frame)
+        times.append((time.perf_counter() - start) * 1000)
+    latency[n] = float(np.median(times))
+
+print(json.dumps({{
+    "load_ms": load_ms,
+    "first_predict_ms": first_predict_ms,
+    "rss_mb": {{"baseline": base_rss, "after_load": load_rss, "after_predict": predict_rss, "peak": rss_mb()}},
+    "predict_ms": latency,
+}}))
+"""
+
+
+def synthetic_artifact(trees, rows, seed=42):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(seed)
+    x = rng.random((rows, len(FEATURE_COLUMNS))) * 100
+    y = np.clip((x[:, 9] + x[:, 10]) / 40 + rng.normal(0, 0.5, rows), 1, 5).round()
+    scaler = StandardScaler().fit(x)
+    model = RandomForestRegressor(n_estimators=trees, n_jobs=-1, random_state=seed).fit(scaler.transform(x), y)
+    return InferenceArtifact(model, FEATURE_COLUMNS, scaler)
+
+
+def directory_size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 2**20
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+def measure(fmt, path, batch_sizes, repeats):
+    script = MEASURE_SCRIPT.format(root=ROOT)
+    output = subprocess.run(
+        [sys.executable, "-c", script, fmt, path, json.dumps(batch_sizes), str(repeats)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare joblib and memory-mapped forest model formats.")
+    parser.add_argument("--artifact", help="existing aqi_artifact.pkl (or legacy rf_model.pkl) to benchmark")
+    parser.add_argument("--trees", type=int, default=1000, help="trees in the synthetic forest")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in the synthetic training set")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[3, 100, 10000], help="rows per predict")
+    parser.add_argument("--repeats", type=int, default=20, help="timed predicts per batch size")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per format")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="aqi-model-format-")
+    try:
+        if args.artifact:
+            artifact = load_artifact(args.artifact, expected_columns=FEATURE_COLUMNS)
+        else:
+            print(f"Training a {args.trees}-tree forest on {args.rows} synthetic rows")
+            artifact = synthetic_artifact(args.trees, args.rows)
+
+        paths = {
+            "joblib": artifact.save(os.path.join(work_dir, ARTIFACT_FILE)),
+            "forest": export_forest(artifact, os.path.join(work_dir, FOREST_DIR)),
+        }
+
+        # Both formats must give the same predictions before their speed is worth comparing
+        x = np.random.default_rng(1).random((1000, len(FEATURE_COLUMNS))) * 100
+        frame = pd.DataFrame(x, columns=FEATURE_COLUMNS)
+        max_diff = float(np.abs(artifact.predict(frame) - load_forest(paths["forest"]).predict(frame)).max())
+        print(f"Max prediction difference: {max_diff:.2e}")
+
+        results = {"max_prediction_diff": max_diff, "formats": {}}
+        for fmt, path in paths.items():
+            runs = [measure(fmt, path, args.batch_sizes, args.repeats) for _ in range(args.runs)]
+            rss = {key: float(np.median([run["rss_mb"][key] - run["rss_mb"]["baseline"] for run in runs]))
+                   for key in ["after_load", "after_predict", "peak"]}
+            summary = {
+                "size_mb": round(directory_size_mb(path), 2),
+                "load_ms": round(float(np.median([run["load_ms"] for run in runs])), 2),
+                "first_predict_ms": round(float(np.median([run["first_predict_ms"] for run in runs])), 2),
+                "rss_delta_mb": {key: round(value, 1) for key, value in rss.items()},
+                "predict_ms": {
+                    n: round(float(np.median([run["predict_ms"][str(n)] for run in runs])), 3)
+                    for n in args.batch_sizes
+                },
+            }
+            results["formats"][fmt] = summary
+
+            print(f"{fmt:<7} size={summary['size_mb']:.1f}MB load={summary['load_ms']:.1f}ms "
+                  f"first_predict={summary['first_predict_ms']:.1f}ms "
+                  f"rss(load/predict)=+{rss['after_load']:.1f}/+{rss['after_predict']:.1f}MB")
+            for n, latency in summary["predict_ms"].items():
+                print(f"    batch={n:<6} predict={latency:.3f}ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# -----------------------------------------------------------------------------------------------------
+# ---------------------------  Load and Latency Benchmark for /predict  -------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Runs webapp/backend/app.py under uvicorn against local stand-ins for OpenWeather and
+# Open-Meteo (serving the recorded JSON in benchmarks/fixtures) and for the model
+# registry (a local registry directory holding the repo's rf_model.pkl), drives it at
+# a configurable concurrency and reports latency percentiles, throughput and the
+# per-stage timings (fetch, features, predict) from the Server-Timing header. With
+# --workers the backend runs through serve.py and each worker's memory is reported.
+#
+# Example:
+#   python benchmarks/bench_predict.py --requests 2000 --concurrency 32 --no-cache
+#   python benchmarks/bench_predict.py --workers 4 --no-cache
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "webapp", "backend")
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+
+# Upstream path -> recorded payload
+FIXTURES = {
+    "/data/2.5/air_pollution/forecast": "air_pollution_forecast.json",
+    "/v1/forecast": "weather_forecast.json",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Local stand-in for the upstream APIs, with optional artificial latency
+def start_upstream_stub(latency_ms):
+    payloads = {}
+    for path, name in FIXTURES.items():
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+            payloads[path] = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            payload = payloads.get(self.path.split("?")[0])
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if payload is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Local stand-in for the model registry: <dir>/random_forest/1/<model file>
+def create_model_registry(model_path):
+    registry_dir = tempfile.mkdtemp(prefix="aqi-registry-")
+    version_dir = os.path.join(registry_dir, "random_forest", "1")
+    os.makedirs(version_dir)
+    shutil.copy(model_path, os.path.join(version_dir, os.path.basename(model_path)))
+    return registry_dir
+
+
+def start_backend(port, upstream_port, registry_dir, args):
+    env = dict(os.environ)
+    env.update({
+        "URL_POLLUTION_FORECAST": f"http://127.0.0.1:{upstream_port}/data/2.5/air_pollution/forecast",
+        "URL_WEATHER_FORECAST": f"http://127.0.0.1:{upstream_port}/v1/forecast",
+        "FEATURE_STORE_BACKEND": "local",
+        "MODEL_REGISTRY_DIR": registry_dir,
+        "OPEN_WEATHER_API": "benchmark",
+    })
+    if args.no_cache:
+        env["FORECAST_TTL_SECONDS"] = "0"
+        env["PREDICTION_TTL_SECONDS"] = "0"
+        # Every stored forecast is stale, so each /predict recomputes
+        env["FORECAST_MAX_AGE_SECONDS"] = "0"
+
+    # Model conversions for shared memory-mapping, the forecast store and the
+    # forecast_data.csv the backend writes in its working directory all go to scratch
+    env["MODEL_CACHE_DIR"] = os.path.join(registry_dir, "cache")
+    env["FORECAST_STORE_PATH"] = os.path.join(registry_dir, "forecast_store.db")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--port", str(port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        cwd=registry_dir, env=env, stdout=subprocess.DEVNULL if args.quiet else None
+    )
+
+    # Wait until the server accepts connections
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Backend did not start in time")
+
+
+def parse_server_timing(header):
+    timings = {}
+    for part in header.split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if duration:
+            timings[name] = float(duration)
+    return timings
+
+
+async def drive(url, total, concurrency, method="GET", body=None):
+    latencies = []
+    stages = {}
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200 or "error" in response.json():
+                    errors += 1
+                for name, duration in parse_server_timing(response.headers.get("Server-Timing", "")).items():
+                    stages.setdefault(name, []).append(duration)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, stages, errors, elapsed
+
+
+def summarize(latencies, stages, errors, elapsed):
+    latencies = np.array(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "max": round(float(latencies.max()), 3),
+        },
+        # Stages only appear on requests that executed them (cache hits skip fetch/features/predict)
+        "stages_ms": {
+            name: {
+                "count": len(values),
+                "mean": round(float(np.mean(values)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+            }
+            for name, values in stages.items()
+        },
+    }
+
+
+# Per-worker memory from /memory; requests land on whichever worker accepts them, and
+# any worker reports all of its siblings
+def print_memory(port):
+    report = httpx.get(f"http://127.0.0.1:{port}/memory", timeout=10).json()
+    for process in report["processes"]:
+        print(f"worker pid={process['pid']:<7} rss={process.get('rss_mb')}MB pss={process.get('pss_mb')}MB "
+              f"shared={process.get('shared_mb')}MB private={process.get('private_mb')}MB "
+              f"model_rss={process.get('model_rss_mb')}MB model_pss={process.get('model_pss_mb')}MB")
+    print(f"total rss={report['total_rss_mb']}MB pss={report['total_pss_mb']}MB "
+          f"(model files {report.get('model_files_mb')}MB)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /predict endpoint against local upstream stubs.")
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrency levels")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each level")
+    parser.add_argument("--path", default="/predict?days=3", help="endpoint to drive")
+    parser.add_argument("--batch-locations", type=int, default=0,
+                        help="drive POST /predict/batch with this many locations instead of --path")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0, help="artificial upstream latency")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="disable the forecast/prediction caches and the forecast store (TTL and max age 0)")
+    parser.add_argument("--model", default=os.path.join(ROOT, "rf_model.pkl"),
+                        help="model file (aqi_artifact.pkl or legacy rf_model.pkl) served by the stub registry")
+    parser.add_argument("--workers", type=int, default=1, help="backend worker processes")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--quiet", action="store_true", help="hide backend output")
+    args = parser.parse_args()
+
+    upstream = start_upstream_stub(args.upstream_latency_ms)
+    registry_dir = create_model_registry(args.model)
+    port = free_port()
+    backend = start_backend(port, upstream.server_address[1], registry_dir, args)
+
+    if args.batch_locations:
+        method, url = "POST", f"http://127.0.0.1:{port}/predict/batch"
+        body = {"locations": [
+            {"latitude": 24.8607 + i * 0.01, "longitude": 67.0011} for i in range(args.batch_locations)
+        ]}
+    else:
+        method, url, body = "GET", f"http://127.0.0.1:{port}{args.path}", None
+
+    results = []
+    memory = None
+    try:
+        for concurrency in args.concurrency:
+            asyncio.run(drive(url, args.warmup, concurrency, method, body))
+            summary = summarize(*asyncio.run(drive(url, args.requests, concurrency, method, body)))
+            summary["concurrency"] = concurrency
+            results.append(summary)
+
+            latency = summary["latency_ms"]
+            print(f"concurrency={concurrency:<4} rps={summary['throughput_rps']:<9} "
+                  f"p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms "
+                  f"errors={summary['errors']}")
+            for name, stage in summary["stages_ms"].items():
+                print(f"    {name:<9} mean={stage['mean']:.2f}ms p95={stage['p95']:.2f}ms (n={stage['count']})")
+        memory = print_memory(port)
+    finally:
+        backend.terminate()
+        backend.wait()
+        upstream.shutdown()
+        shutil.rmtree(registry_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"path": url, "no_cache": args.no_cache, "workers": args.workers, "results": results,
+                       "memory": memory}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
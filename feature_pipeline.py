@@ -5,10 +5,18 @@
 # -----------------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------------
 
+import startup
 import os
+import sys
 import requests
-from datetime import datetime
-import hopsworks
+from feature_store import FEATURE_GROUP, ROLLING_FEATURE_GROUP, ROLLING_FEATURE_GROUP_DESCRIPTION, get_store
+from features import build_feature_frame, join_by_position, pollution_frame, weather_frame
+from ingest_buffer import INGEST_MODE, IngestBuffer
+from instrumentation import count, print_summary_at_exit, timed
+from rolling_features import ROLLING_BUFFER_FILE, ROLLING_COLUMNS, ROLLING_DTYPES, RollingState
+
+startup.mark("imports")
+print_summary_at_exit("feature_pipeline")
 
 # API URLs
 open_weather_url = "http://api.openweathermap.org/data/2.5/air_pollution"
@@ -16,112 +24,76 @@ open_meteo_url = "https://api.open-meteo.com/v1/forecast"
 
 # Fetch API keys from environment variables
 open_weather_api_key = os.getenv("OPEN_WEATHER_API")
-hopsworks_api_key = os.getenv("HOPSWORKS_API_KEY")
 
 # Location details
 latitude = 24.8607
 longitude = 67.0011
 
 # Default values
-aqi_change_rate = 0
 day_offset = 0
 
-# Initialize Hopsworks connection
-project = hopsworks.login(api_key_value=hopsworks_api_key)
-fs = project.get_feature_store()
+# Feature store selected by FEATURE_STORE_BACKEND; Hopsworks logs in on first use
+store = get_store()
 
 # Fetch Air Pollution Data
 try:
-    air_pollution_response = requests.get(open_weather_url, params={
-        "lat": latitude,
-        "lon": longitude,
-        "appid": open_weather_api_key
-    })
-    air_pollution_response.raise_for_status()
+    with timed("ingest_fetch_seconds", api="pollution"):
+        air_pollution_response = requests.get(open_weather_url, params={
+            "lat": latitude,
+            "lon": longitude,
+            "appid": open_weather_api_key
+        })
+        air_pollution_response.raise_for_status()
     air_pollution_data = air_pollution_response.json()
 except requests.exceptions.RequestException as e:
     print(f"Error fetching Air Pollution Data: {e}")
 
 # Fetch Weather Data
 try:
-    weather_response = requests.get(open_meteo_url, params={
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": True,
-        "timezone": "Asia/Karachi",
-        "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum", "windspeed_10m_max"]
-    })
-    weather_response.raise_for_status()
+    with timed("ingest_fetch_seconds", api="weather"):
+        weather_response = requests.get(open_meteo_url, params={
+            "latitude": latitude,
+            "longitude": longitude,
+            "current_weather": True,
+            "timezone": "Asia/Karachi",
+            "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum", "windspeed_10m_max"]
+        })
+        weather_response.raise_for_status()
     weather_data = weather_response.json()
 except requests.exceptions.RequestException as e:
     print(f"Error fetching Weather Data: {e}")
 
-# Extract Air Pollution Data
-timestamp = air_pollution_data["list"][0]["dt"]
-readable_time = datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-hour = datetime.utcfromtimestamp(timestamp).hour
-day = datetime.utcfromtimestamp(timestamp).day
-month = datetime.utcfromtimestamp(timestamp).month
-
-aqi = air_pollution_data["list"][0]["main"]["aqi"]
-components = air_pollution_data["list"][0]["components"]
-co = components.get("co", 0)
-no = components.get("no", 0)
-no2 = components.get("no2", 0)
-o3 = components.get("o3", 0)
-so2 = components.get("so2", 0)
-pm2_5 = components.get("pm2_5", 0)
-pm10 = components.get("pm10", 0)
-nh3 = components.get("nh3", 0)
-
-# Extract Weather Data
-daily_data = weather_data.get("daily", {})
-max_temp = daily_data.get("temperature_2m_max", [0])[0]
-min_temp = daily_data.get("temperature_2m_min", [0])[0]
-precipitation = daily_data.get("precipitation_sum", [0])[0]
-max_wind_speed = daily_data.get("windspeed_10m_max", [0])[0]
-if precipitation is None:
-    precipitation = 0.0
-# Combine data into a single dictionary
-data = {
-    "readable_time": readable_time,
-    "day_offset": int(day_offset),
-    "hour": int(hour),
-    "day": int(day),
-    "month": int(month),
-    "latitude": latitude,
-    "longitude": longitude,
-    "aqi": int(aqi),
-    "aqi_change_rate": int(aqi_change_rate),
-    "co": float(co),
-    "no": int(no),
-    "no2": float(no2),
-    "o3": float(o3),
-    "so2": float(so2),
-    "pm2_5": float(pm2_5),
-    "pm10": float(pm10),
-    "nh3": float(nh3),
-    "max_temp": float(max_temp),
-    "min_temp": float(min_temp),
-    "precipitation": float(precipitation),
-    "max_wind_speed": float(max_wind_speed)
-}
-
-# Convert to Pandas DataFrame
-import pandas as pd
-
-data_df = pd.DataFrame([data])
-
-# Create or Get Feature Group
-feature_group = fs.get_or_create_feature_group(
-    name="weather_and_pollutant_data",
-    version=1,
-    primary_key=["readable_time"],
-    description="weather and air pollution data of 400 days",
-    online_enabled=True
-)
-
-# Insert data into the feature store
-feature_group.insert(data_df)
-
-print("Data successfully inserted into the Hopsworks Feature Store!")
\ No newline at end of file
+# Build the feature row from the current reading and today's weather
+pollution = pollution_frame(air_pollution_data["list"][:1], time_format="%Y-%m-%d %H:%M:%S")
+weather = weather_frame(weather_data.get("daily", {}))
+data_df = build_feature_frame(join_by_position(pollution, weather), latitude, longitude, day_offset)
+
+# Rolling-window and lag features of the new reading, updated in O(1) from the
+# persisted window state instead of re-reading the past week from the feature store
+with timed("ingest_rolling_seconds"):
+    rolling_state = RollingState.load()
+    rolling_df = rolling_state.update_frame(data_df)
+    rolling_state.save()
+
+# Buffered mode appends the row locally and only writes to the feature store once a batch
+# is full or old enough (or when run with --flush); direct mode inserts every run
+if INGEST_MODE == "buffered":
+    buffer = IngestBuffer()
+    buffer.append(data_df)
+    rolling_buffer = IngestBuffer(ROLLING_BUFFER_FILE, columns=ROLLING_COLUMNS, dtypes=ROLLING_DTYPES)
+    rolling_buffer.append(rolling_df)
+    count("ingest_rows_buffered_total", len(data_df))
+    if "--flush" in sys.argv or buffer.should_flush():
+        flushed = buffer.flush(store, FEATURE_GROUP)
+        rolling_buffer.flush(store, ROLLING_FEATURE_GROUP, description=ROLLING_FEATURE_GROUP_DESCRIPTION)
+        print(f"{flushed} buffered rows successfully inserted into the {store} Feature Store!")
+    else:
+        print(f"Row buffered in {buffer.path} ({len(buffer.pending())} pending)")
+else:
+    # Insert data into the feature store (an upsert on readable_time)
+    store.insert(FEATURE_GROUP, data_df)
+    store.insert(ROLLING_FEATURE_GROUP, rolling_df, description=ROLLING_FEATURE_GROUP_DESCRIPTION)
+
+    print(f"Data successfully inserted into the {store} Feature Store!")
+
+startup.print_report()
@@ -0,0 +1,232 @@
+# -----------------------------------------------------------------------------------------------------
+# ----------------------------------  Feature Store Backends  -----------------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# One storage interface for the pipelines and the backend, selected with FEATURE_STORE_BACKEND:
+#   hopsworks - the Hopsworks Feature Store and Model Registry (login deferred to first use)
+#   local     - a SQLite database plus a model directory, so everything runs without network
+#
+# Feature groups are keyed on readable_time: insert() upserts, read_range() scans the
+# half-open range [start, end) and lookup() fetches rows by key. Models are registered as
+# export directories and resolved to a local directory per version.
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import pandas as pd
+from instrumentation import count, timed
+
+FEATURE_STORE_BACKEND = os.getenv("FEATURE_STORE_BACKEND", "hopsworks")  # hopsworks or local
+
+# Location of the local backend's database and model registry
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "feature_store")
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(FEATURE_STORE_DIR, "models"))
+
+# The feature group every pipeline reads and writes
+FEATURE_GROUP = "weather_and_pollutant_data"
+FEATURE_GROUP_VERSION = 1
+FEATURE_GROUP_DESCRIPTION = "weather and air pollution data of 400 days"
+PRIMARY_KEY = "readable_time"
+
+# Every hourly reading, written by the hourly backfill (BACKFILL_MODE=hourly)
+HOURLY_FEATURE_GROUP = "weather_and_pollutant_hourly"
+HOURLY_FEATURE_GROUP_DESCRIPTION = "hourly weather and air pollution data of 400 days"
+
+# Rolling-window and lag features of the pollutants (rolling_features.py)
+ROLLING_FEATURE_GROUP = "pollutant_rolling_features"
+ROLLING_FEATURE_GROUP_DESCRIPTION = "24h/7d rolling mean, max and std and 1h/24h lags of pm2_5, pm10, no2 and o3"
+
+
+class HopsworksStore:
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.getenv("HOPSWORKS_API_KEY")
+        self._project = None
+        self._feature_groups = {}
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return "Hopsworks"
+
+    def project(self):
+        # Login once, on first use, instead of at import time
+        with self._lock:
+            if self._project is None:
+                with timed("hopsworks_login_seconds"):
+                    import hopsworks
+                    self._project = hopsworks.login(api_key_value=self.api_key)
+            return self._project
+
+    def feature_group(self, name, version=FEATURE_GROUP_VERSION, description=FEATURE_GROUP_DESCRIPTION):
+        if (name, version) not in self._feature_groups:
+            self._feature_groups[(name, version)] = self.project().get_feature_store().get_or_create_feature_group(
+                name=name,
+                version=version,
+                primary_key=[PRIMARY_KEY],
+                description=description,
+                online_enabled=True
+            )
+        return self._feature_groups[(name, version)]
+
+    def insert(self, name, df, version=FEATURE_GROUP_VERSION, description=FEATURE_GROUP_DESCRIPTION):
+        # Inserts into a feature group with a primary key are upserts
+        feature_group = self.feature_group(name, version, description)
+        with timed("feature_store_insert_seconds", backend="hopsworks", feature_group=name):
+            feature_group.insert(df)
+        count("feature_store_rows_inserted_total", len(df), backend="hopsworks", feature_group=name)
+
+    def read(self, name, columns=None, version=FEATURE_GROUP_VERSION):
+        return self.read_range(name, columns=columns, version=version)
+
+    def read_range(self, name, start=None, end=None, columns=None, version=FEATURE_GROUP_VERSION):
+        feature_group = self.feature_group(name, version)
+        with timed("feature_store_read_seconds", backend="hopsworks", feature_group=name):
+            if start is None and end is None and columns is None:
+                return feature_group.read()
+            query = feature_group.select(columns) if columns else feature_group.select_all()
+            if start is not None:
+                query = query.filter(feature_group.readable_time >= start)
+            if end is not None:
+                query = query.filter(feature_group.readable_time < end)
+            return query.read()
+
+    def lookup(self, name, keys, version=FEATURE_GROUP_VERSION):
+        feature_group = self.feature_group(name, version)
+        return feature_group.filter(feature_group.readable_time.isin(list(keys))).read()
+
+    def latest_model_version(self, model_name):
+        models = self.project().get_model_registry().get_models(name=model_name)
+        return max(m.version for m in models)
+
+    def model_dir(self, model_name, version, cache_dir):
+        model_dir = os.path.join(cache_dir, model_name, str(version))
+        if os.path.isdir(model_dir):
+            return model_dir
+
+        # Download into a temporary directory first so an interrupted download
+        # never leaves a half-written artifact in the cache
+        os.makedirs(os.path.dirname(model_dir), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(model_dir))
+        try:
+            registry = self.project().get_model_registry()
+            with timed("model_download_seconds", model=model_name):
+                registry.get_model(model_name, version=version).download(local_path=tmp_dir)
+            os.replace(tmp_dir, model_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return model_dir
+
+    def save_model(self, model_name, export_dir, metrics, description):
+        registry = self.project().get_model_registry()
+        model = registry.python.create_model(name=model_name, metrics=metrics, description=description)
+        model.save(export_dir)
+        return model.version
+
+
+class LocalStore:
+    def __init__(self, directory=FEATURE_STORE_DIR, registry_dir=MODEL_REGISTRY_DIR):
+        self.directory = directory
+        self.registry_dir = registry_dir
+        self.path = os.path.join(directory, "feature_store.db")
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return f"local ({self.path})"
+
+    def _connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return sqlite3.connect(self.path)
+
+    @staticmethod
+    def _table(name, version):
+        return f'"{name}_v{version}"'
+
+    def _columns(self, connection, table):
+        return [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+
+    def insert(self, name, df, version=FEATURE_GROUP_VERSION, description=FEATURE_GROUP_DESCRIPTION):
+        if df.empty:
+            return
+        table = self._table(name, version)
+        columns = list(df.columns)
+        count("feature_store_rows_inserted_total", len(df), backend="local", feature_group=name)
+        with timed("feature_store_insert_seconds", backend="local", feature_group=name), \
+                self._lock, self._connect() as connection:
+            existing = self._columns(connection, table)
+            if not existing:
+                definitions = ", ".join(
+                    f'"{column}" TEXT PRIMARY KEY' if column == PRIMARY_KEY else f'"{column}"' for column in columns
+                )
+                connection.execute(f"CREATE TABLE {table} ({definitions})")
+            for column in columns:
+                if existing and column not in existing:
+                    connection.execute(f'ALTER TABLE {table} ADD COLUMN "{column}"')
+
+            names = ", ".join(f'"{column}"' for column in columns)
+            updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns if column != PRIMARY_KEY)
+            rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            connection.executemany(
+                f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT({PRIMARY_KEY}) DO UPDATE SET {updates}",
+                rows
+            )
+
+    def _query(self, name, version, columns, where="", params=()):
+        table = self._table(name, version)
+        with timed("feature_store_read_seconds", backend="local", feature_group=name), self._connect() as connection:
+            if not self._columns(connection, table):
+                return pd.DataFrame(columns=columns or [])
+            selected = ", ".join(f'"{column}"' for column in columns) if columns else "*"
+            return pd.read_sql_query(
+                f"SELECT {selected} FROM {table} {where} ORDER BY {PRIMARY_KEY}", connection, params=params
+            )
+
+    def read(self, name, columns=None, version=FEATURE_GROUP_VERSION):
+        return self._query(name, version, columns)
+
+    def read_range(self, name, start=None, end=None, columns=None, version=FEATURE_GROUP_VERSION):
+        conditions, params = [], []
+        if start is not None:
+            conditions.append(f"{PRIMARY_KEY} >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{PRIMARY_KEY} < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(name, version, columns, where, params)
+
+    def lookup(self, name, keys, version=FEATURE_GROUP_VERSION):
+        keys = list(keys)
+        if not keys:
+            return self._query(name, version, None, "WHERE 0")
+        return self._query(name, version, None, f"WHERE {PRIMARY_KEY} IN ({', '.join('?' * len(keys))})", keys)
+
+    # Registry layout: <registry_dir>/<model_name>/<version>/<export files>
+    def latest_model_version(self, model_name):
+        versions = os.listdir(os.path.join(self.registry_dir, model_name))
+        return max(int(version) for version in versions if version.isdigit())
+
+    def model_dir(self, model_name, version, cache_dir=None):
+        return os.path.join(self.registry_dir, model_name, str(version))
+
+    def save_model(self, model_name, export_dir, metrics, description):
+        try:
+            version = self.latest_model_version(model_name) + 1
+        except (FileNotFoundError, ValueError):
+            version = 1
+        model_dir = self.model_dir(model_name, version)
+        shutil.copytree(export_dir, model_dir)
+        with open(os.path.join(model_dir, "model.json"), "w") as f:
+            json.dump({"metrics": metrics, "description": description}, f, indent=2, default=float)
+        print(f"Registered {model_name} version {version} in {self.registry_dir}")
+        return version
+
+
+def get_store(backend=FEATURE_STORE_BACKEND):
+    if backend == "hopsworks":
+        return HopsworksStore()
+    if backend == "local":
+        return LocalStore()
+    raise ValueError(f"Unknown FEATURE_STORE_BACKEND {backend!r}, expected 'hopsworks' or 'local'")
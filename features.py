@@ -0,0 +1,170 @@
+# -----------------------------------------------------------------------------------------------------
+# ------------------------------  Shared Feature Construction  ----------------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Turns raw OpenWeather `list` arrays and Open-Meteo `daily` arrays into the feature
+# frame with columnar pandas operations. Used by the backfill (historical.py), the
+# hourly ingest (feature_pipeline.py) and serving (webapp/backend) so training and
+# serving features are built by the same code.
+
+import pandas as pd
+
+POLLUTANTS = ["co", "no", "no2", "o3", "so2", "pm2_5", "pm10", "nh3"]
+
+# Column order of the rows stored in the weather_and_pollutant_data feature group
+ROW_COLUMNS = [
+    "readable_time", "day_offset", "hour", "day", "month", "latitude", "longitude",
+    "aqi", "aqi_change_rate", "co", "no", "no2", "o3", "so2", "pm2_5", "pm10", "nh3",
+    "max_temp", "min_temp", "precipitation", "max_wind_speed"
+]
+
+ROW_DTYPES = {
+    "day_offset": int, "hour": int, "day": int, "month": int,
+    "latitude": float, "longitude": float, "aqi": int, "aqi_change_rate": int,
+    "co": float, "no": int, "no2": float, "o3": float, "so2": float,
+    "pm2_5": float, "pm10": float, "nh3": float,
+    "max_temp": float, "min_temp": float, "precipitation": float, "max_wind_speed": float
+}
+
+# Rows of the weather_and_pollutant_hourly feature group (hourly backfill): every
+# OpenWeather reading with the day's weather aggregates plus that hour's weather
+HOURLY_WEATHER_COLUMNS = {
+    "temperature_2m": "temperature",
+    "relative_humidity_2m": "humidity",
+    "precipitation": "hourly_precipitation",
+    "windspeed_10m": "wind_speed"
+}
+HOURLY_ROW_COLUMNS = ROW_COLUMNS + list(HOURLY_WEATHER_COLUMNS.values())
+HOURLY_ROW_DTYPES = {**ROW_DTYPES, **{column: float for column in HOURLY_WEATHER_COLUMNS.values()}}
+
+# Model inputs: the stored row minus identifiers and the aqi target
+FEATURE_COLUMNS = [
+    "hour", "day", "month", "aqi_change_rate", "co", "no", "no2", "o3", "so2",
+    "pm2_5", "pm10", "nh3", "max_temp", "min_temp", "precipitation", "max_wind_speed"
+]
+
+# Open-Meteo daily variables and their feature names
+WEATHER_COLUMNS = {
+    "temperature_2m_max": "max_temp",
+    "temperature_2m_min": "min_temp",
+    "precipitation_sum": "precipitation",
+    "windspeed_10m_max": "max_wind_speed"
+}
+
+DATE_FORMAT = "%Y-%m-%d"
+HOURLY_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# The OpenWeather pollution forecast covers the next 96 hours
+MAX_FORECAST_DAYS = 4
+
+
+# OpenWeather `list` -> one row per reading with aqi, components and time parts
+def pollution_frame(readings, time_format=DATE_FORMAT):
+    frame = pd.json_normalize(readings)
+    frame.columns = [column.split(".")[-1] for column in frame.columns]
+    frame = frame.reindex(columns=["dt", "aqi"] + POLLUTANTS)
+    frame[POLLUTANTS] = frame[POLLUTANTS].fillna(0)
+    frame = frame.sort_values("dt", ignore_index=True)
+
+    timestamps = pd.to_datetime(frame["dt"], unit="s")
+    frame["date"] = timestamps.dt.strftime(DATE_FORMAT)
+    frame["readable_time"] = timestamps.dt.strftime(time_format)
+    frame["hour"] = timestamps.dt.hour
+    frame["day"] = timestamps.dt.day
+    frame["month"] = timestamps.dt.month
+    return frame
+
+
+# Open-Meteo `daily` -> one row per date, with missing precipitation filled with 0
+def weather_frame(daily):
+    frame = pd.DataFrame({"date": daily.get("time", [])})
+    for source, column in WEATHER_COLUMNS.items():
+        values = daily.get(source)
+        frame[column] = pd.to_numeric(pd.Series(values), errors="coerce") if values is not None else 0.0
+    frame["precipitation"] = frame["precipitation"].fillna(0.0)
+    return frame
+
+
+# Open-Meteo `hourly` (requested in GMT) -> one row per hour keyed on unix time like OpenWeather's dt
+def hourly_weather_frame(hourly):
+    timestamps = pd.to_datetime(pd.Series(hourly.get("time", []), dtype=object))
+    frame = pd.DataFrame({"dt": (timestamps - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)})
+    for source, column in HOURLY_WEATHER_COLUMNS.items():
+        values = hourly.get(source)
+        frame[column] = pd.to_numeric(pd.Series(values), errors="coerce") if values is not None else 0.0
+    frame["hourly_precipitation"] = frame["hourly_precipitation"].fillna(0.0)
+    return frame
+
+
+# Pair pollution and weather rows on the calendar date (backfill and forecasts)
+def join_by_date(pollution, weather):
+    return pollution.merge(weather, on="date", how="inner")
+
+
+# Pair pollution readings with the hourly weather of the same hour (hourly backfill)
+def join_by_timestamp(pollution, hourly_weather):
+    return pollution.merge(hourly_weather, on="dt", how="inner")
+
+
+# Pair the i-th pollution row with the i-th weather row (current data and forecasts)
+def join_by_position(pollution, weather):
+    rows = min(len(pollution), len(weather))
+    return pd.concat(
+        [pollution.iloc[:rows].reset_index(drop=True), weather.iloc[:rows].drop(columns="date").reset_index(drop=True)],
+        axis=1
+    )
+
+
+# Daily value of each pollutant and the AQI: the first reading of the UTC date, which is
+# what the daily backfill has always stored and the model is trained on. The backfill and
+# the daily forecast both reduce readings here, so changing it changes both (and needs a
+# re-backfill and retrain).
+DAILY_AGGREGATION = "first"
+
+
+# Readings (pollution_frame rows) -> one row per date, sorted by date
+def daily_pollution(pollution, aggregation=DAILY_AGGREGATION):
+    agg = {column: aggregation for column in ["aqi"] + POLLUTANTS}
+    agg.update({column: "first" for column in ["dt", "readable_time", "hour", "day", "month"]})
+    daily = pollution.groupby("date", as_index=False, sort=True).agg(agg)
+    daily["aqi"] = daily["aqi"].round()
+    return daily
+
+
+# Hourly pollution forecast aligned to the daily weather forecast (both keyed on UTC
+# dates). With resolution="daily" the readings of each date are reduced to one row by
+# daily_pollution, like the backfilled training rows; with resolution="hourly" every
+# reading is kept. Returns the joined rows of the first day_count dates and their
+# 1-based day offsets.
+def assemble_forecast(readings, daily, day_count, resolution="daily"):
+    pollution = pollution_frame(readings, time_format=HOURLY_FORMAT if resolution == "hourly" else DATE_FORMAT)
+    if resolution == "daily":
+        pollution = daily_pollution(pollution)
+
+    # Offsets count the dates that have both pollution and weather, so a date missing
+    # on either side doesn't shift the ones after it
+    days = join_by_date(pollution, weather_frame(daily))
+    dates = sorted(days["date"].unique())[:day_count]
+    days = days[days["date"].isin(dates)].reset_index(drop=True)
+    day_offset = days["date"].map({date: i for i, date in enumerate(dates, start=1)})
+    return days, day_offset
+
+
+# AQI change against the previous row, 0 for the first one
+def change_rate(aqi):
+    return aqi.diff().fillna(0).astype(int)
+
+
+# Joined pollution/weather rows -> typed feature frame in ROW_COLUMNS (or the given) order
+def build_feature_frame(days, latitude, longitude, day_offset, columns=ROW_COLUMNS, dtypes=ROW_DTYPES):
+    frame = days.copy()
+    frame["day_offset"] = day_offset
+    frame["latitude"] = latitude
+    frame["longitude"] = longitude
+    frame["aqi_change_rate"] = change_rate(frame["aqi"])
+    return frame[columns].astype(dtypes)
+
+
+# Feature frame -> model input matrix in training column order
+def feature_matrix(frame):
+    return frame[FEATURE_COLUMNS]
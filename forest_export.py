@@ -0,0 +1,138 @@
+# -----------------------------------------------------------------------------------------------------
+# ----------------------------  Compact Random Forest Export Format  ----------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Writes a fitted RandomForestRegressor as flat NumPy arrays (one .npy file each for
+# node features, thresholds, children and leaf values, plus tree roots) that load with
+# memory-mapping instead of unpickling, and predicts over those arrays with vectorized
+# traversal of all trees at once. The export directory also carries the scaler and
+# feature columns so it is a complete inference artifact.
+
+import json
+import os
+import numpy as np
+from inference_artifact import InferenceArtifact, schema_hash
+
+FOREST_DIR = "aqi_forest"
+FOREST_FORMAT_VERSION = 1
+FOREST_ARRAYS = ["feature", "threshold", "left", "right", "value", "roots"]
+
+# Rows traversed per step in FlatForest.predict, bounding the (rows x trees) node matrix
+PREDICT_CHUNK_ROWS = 4096
+
+
+# StandardScaler reduced to its two arrays
+class ArrayScaler:
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, x):
+        return (x - self.mean) / self.scale
+
+
+class FlatForest:
+    def __init__(self, arrays, max_depth):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = max_depth
+
+    def predict(self, x):
+        # Like scikit-learn, compare float32 inputs against the float64 thresholds
+        x = np.asarray(x, dtype=np.float32)
+        return np.concatenate([
+            self._predict_chunk(x[start:start + PREDICT_CHUNK_ROWS])
+            for start in range(0, len(x), PREDICT_CHUNK_ROWS)
+        ]) if len(x) else np.empty(0)
+
+    def _predict_chunk(self, x):
+        # One node per (row, tree); leaves point to themselves, so max_depth steps reach every leaf
+        rows = np.arange(len(x))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(x), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = x[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
+
+
+def flatten_forest(model):
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        leaf = tree.children_left == -1
+
+        # Leaves loop back to themselves with a feature/threshold that is never used
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        lefts.append(np.where(leaf, node_ids, tree.children_left).astype(np.int32) + offset)
+        rights.append(np.where(leaf, node_ids, tree.children_right).astype(np.int32) + offset)
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+        offset += tree.node_count
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    max_depth = max(estimator.tree_.max_depth for estimator in model.estimators_)
+    return arrays, max_depth
+
+
+# Exports an InferenceArtifact holding a random forest to a directory of .npy files
+def export_forest(artifact, directory=FOREST_DIR):
+    os.makedirs(directory, exist_ok=True)
+    arrays, max_depth = flatten_forest(artifact.model)
+    if artifact.scaler is not None:
+        arrays["scaler_mean"] = artifact.scaler.mean_
+        arrays["scaler_scale"] = artifact.scaler.scale_
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+    meta = {
+        "format_version": FOREST_FORMAT_VERSION,
+        "n_trees": len(arrays["roots"]),
+        "n_nodes": len(arrays["value"]),
+        "max_depth": max_depth,
+        "feature_columns": artifact.feature_columns,
+        "schema_hash": artifact.schema_hash,
+        "has_scaler": artifact.scaler is not None,
+        "metadata": artifact.metadata,
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    return directory
+
+
+# Loads an exported forest as an InferenceArtifact; mmap=True maps the arrays read-only
+def load_forest(directory=FOREST_DIR, mmap=True, expected_columns=None):
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["format_version"] != FOREST_FORMAT_VERSION:
+        raise ValueError(f"Unsupported forest format version {meta['format_version']} in {directory}")
+
+    mmap_mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in FOREST_ARRAYS}
+    scaler = None
+    if meta["has_scaler"]:
+        scaler = ArrayScaler(
+            np.load(os.path.join(directory, "scaler_mean.npy")), np.load(os.path.join(directory, "scaler_scale.npy"))
+        )
+
+    artifact = InferenceArtifact(FlatForest(arrays, meta["max_depth"]), meta["feature_columns"], scaler, meta["metadata"])
+    if artifact.schema_hash != meta["schema_hash"]:
+        raise ValueError(f"Forest {directory} is corrupt: schema hash does not match its feature columns")
+    if expected_columns is not None and artifact.schema_hash != schema_hash(expected_columns):
+        raise ValueError(
+            f"Forest {directory} was trained on {artifact.feature_columns}, serving builds {list(expected_columns)}"
+        )
+    return artifact
@@ -7,11 +7,30 @@
 
 # Backfilling Weather and Pollutant Historical Data for 400 days
 
+import glob
 import os
+import threading
+import time
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
-import hopsworks
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from feature_store import (
+    FEATURE_GROUP, FEATURE_GROUP_DESCRIPTION, HOURLY_FEATURE_GROUP, HOURLY_FEATURE_GROUP_DESCRIPTION,
+    ROLLING_FEATURE_GROUP, ROLLING_FEATURE_GROUP_DESCRIPTION, get_store
+)
+from instrumentation import count, print_summary_at_exit, timed
+from features import (
+    HOURLY_FORMAT, HOURLY_ROW_COLUMNS, HOURLY_ROW_DTYPES, HOURLY_WEATHER_COLUMNS, ROW_COLUMNS, ROW_DTYPES,
+    build_feature_frame, change_rate, daily_pollution, hourly_weather_frame, join_by_date, join_by_timestamp,
+    pollution_frame, weather_frame
+)
+from rolling_features import ROLLING_POLLUTANTS, RollingState, rolling_feature_frame
 
 # URLs
 URL_POLLUTION = "http://api.openweathermap.org/data/2.5/air_pollution/history"
@@ -19,155 +38,392 @@ URL_WEATHER = "https://archive-api.open-meteo.com/v1/archive"
 
 # Fetch API keys from environment variables
 API_KEY = os.getenv("OPEN_WEATHER_API")
-hopsworks_api_key = os.getenv("HOPSWORKS_API_KEY")
 
 # Location
 LATITUDE = 24.8607
 LONGITUDE = 67.0011
 
-# Initialize Hopsworks Feature Store
-project = hopsworks.login(api_key_value=hopsworks_api_key)
-fs = project.get_feature_store()
+# Backfill engine settings
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", 8))
+BACKFILL_REQUESTS_PER_SECOND = float(os.getenv("BACKFILL_REQUESTS_PER_SECOND", 10))
+BACKFILL_MAX_RETRIES = int(os.getenv("BACKFILL_MAX_RETRIES", 5))
+BACKFILL_BACKOFF_FACTOR = float(os.getenv("BACKFILL_BACKOFF_FACTOR", 0.5))
 
+# daily:  the first reading of each day, into weather_and_pollutant_data
+# hourly: every reading (24 per day from the same API calls) joined with that hour's
+#         weather, into weather_and_pollutant_hourly
+BACKFILL_MODE = os.getenv("BACKFILL_MODE", "daily")
+if BACKFILL_MODE not in ("daily", "hourly"):
+    raise ValueError(f"Unknown BACKFILL_MODE {BACKFILL_MODE!r}, expected 'daily' or 'hourly'")
+HOURLY = BACKFILL_MODE == "hourly"
 
-# Insert into Feature Store
-feature_group = fs.get_feature_group(name="weather_and_pollutant_data", version=1)
+BACKFILL_FEATURE_GROUP = HOURLY_FEATURE_GROUP if HOURLY else FEATURE_GROUP
+BACKFILL_DESCRIPTION = HOURLY_FEATURE_GROUP_DESCRIPTION if HOURLY else FEATURE_GROUP_DESCRIPTION
+BACKFILL_COLUMNS = HOURLY_ROW_COLUMNS if HOURLY else ROW_COLUMNS
+BACKFILL_DTYPES = HOURLY_ROW_DTYPES if HOURLY else ROW_DTYPES
 
+# Number of days requested per API call
+BACKFILL_CHUNK_DAYS = int(os.getenv("BACKFILL_CHUNK_DAYS", 30))
+
+# Local Parquet checkpoint of fetched days, one file per month, so failed or repeated runs resume
+BACKFILL_CHECKPOINT_DIR = os.getenv(
+    "BACKFILL_CHECKPOINT_DIR", os.path.join("backfill_checkpoint", "hourly") if HOURLY else "backfill_checkpoint"
+)
+
+# Rows per feature store insert; batches are streamed, so memory is bounded by this
+# and the checkpoint month size rather than by the backfilled range
+BACKFILL_INSERT_ROWS = int(os.getenv("BACKFILL_INSERT_ROWS", 50000))
+BACKFILL_OUTPUT_CSV = os.getenv("BACKFILL_OUTPUT_CSV", "aqi_data_hourly.csv" if HOURLY else "aqi_data.csv")
+
+# Upsert every backfilled row instead of only the missing ones, to rewrite rows stored by
+# an older backfill (e.g. aqi_change_rate, which was stored with the opposite sign)
+BACKFILL_REWRITE = os.getenv("BACKFILL_REWRITE", "0") == "1"
+
+# Fixed Arrow schema of every record batch, matching the feature group rows
+ROW_SCHEMA = pa.schema(
+    [("readable_time", pa.string())]
+    + [(column, pa.int64() if BACKFILL_DTYPES[column] is int else pa.float64()) for column in BACKFILL_COLUMNS[1:]]
+)
+
+
+# Feature store selected by FEATURE_STORE_BACKEND; Hopsworks logs in on first use
+store = get_store()
+
+
+# Pooled HTTP session shared by all backfill workers, retrying throttled and
+# failed requests with exponential backoff
+def create_session(pool_size):
+    retry = Retry(
+        total=BACKFILL_MAX_RETRIES,
+        backoff_factor=BACKFILL_BACKOFF_FACTOR,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Spaces requests out evenly across all workers
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+session = create_session(BACKFILL_CONCURRENCY)
+rate_limiter = RateLimiter(BACKFILL_REQUESTS_PER_SECOND)
 
 # Function to fetch data
 def fetch_data(url_pollution, params_pollution, url_weather, params_weather):
     try:
-        response_pollution = requests.get(url_pollution, params=params_pollution)
-        response_pollution.raise_for_status()
-        air_data = response_pollution.json()
-        print(f"======>pollution{air_data}")
+        with timed("backfill_rate_limit_wait_seconds"):
+            rate_limiter.wait()
+        with timed("backfill_fetch_seconds", api="pollution"):
+            response_pollution = session.get(url_pollution, params=params_pollution)
+            response_pollution.raise_for_status()
+            air_data = response_pollution.json()
+        print(f"======>pollution: {len(air_data.get('list', []))} readings")
 
-        response_weather = requests.get(url_weather, params=params_weather)
-        response_weather.raise_for_status()
-        weather_data = response_weather.json()
-        print(f"======>weather{weather_data}")
+        with timed("backfill_rate_limit_wait_seconds"):
+            rate_limiter.wait()
+        with timed("backfill_fetch_seconds", api="weather"):
+            response_weather = session.get(url_weather, params=params_weather)
+            response_weather.raise_for_status()
+            weather_data = response_weather.json()
+        print(f"======>weather: {len(weather_data.get('daily', {}).get('time', []))} days")
 
         return air_data, weather_data
     except requests.exceptions.RequestException as e:
+        count("backfill_fetch_errors_total")
         print(f"Error fetching data: {e}")
         return None, None
 
-# Function to process and save data into a DataFrame
-def process_data(air_data, weather_data, day_offset, previous_aqi):
-    # Check if air_data['list'] is empty
-    if not air_data["list"]:
-        print(f"No pollution data for day {day_offset}")
-        return None, previous_aqi  # Skip this iteration if no pollution data
-
-    # Extract Air Pollution Data
-    coordinates = air_data["coord"]
-    aqi = air_data["list"][0]["main"]["aqi"]
-    components = air_data["list"][0]["components"]
-    timestamp = air_data["list"][0]["dt"]
-    readable_time = datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')  # Only date
-
-    # Compute AQI Change Rate
-    aqi_change_rate = 0 if previous_aqi is None else aqi - previous_aqi
-
-    # Extract Weather Data
-    max_temp = weather_data["daily"]["temperature_2m_max"][0]
-    min_temp = weather_data["daily"]["temperature_2m_min"][0]
-    precipitation = weather_data["daily"].get("precipitation_sum", [0])[0]
-    wind_speed = weather_data["daily"]["windspeed_10m_max"][0]
-    if precipitation is None:
-        precipitation = 0.0
-    # Compute additional features
-    hour = datetime.utcfromtimestamp(timestamp).hour
-    day = datetime.utcfromtimestamp(timestamp).day
-    month = datetime.utcfromtimestamp(timestamp).month
-
-    # Combine into a single row
-    row = {
-        "readable_time": readable_time,
-        "day_offset": int(day_offset),
-        "hour": int(hour),
-        "day": int(day),
-        "month": int(month),
-        "latitude": coordinates["lat"],
-        "longitude": coordinates["lon"],
-        "aqi": int(aqi),
-        "aqi_change_rate": int(aqi_change_rate),
-        "co": float(components["co"]),
-        "no": int(components["no"]),
-        "no2": float(components["no2"]),
-        "o3": float(components["o3"]),
-        "so2": float(components["so2"]),
-        "pm2_5": float(components["pm2_5"]),
-        "pm10": float(components["pm10"]),
-        "nh3": float(components["nh3"]),
-        "max_temp": float(max_temp),
-        "min_temp": float(min_temp),
-        "precipitation": float(precipitation),
-        "max_wind_speed": float(wind_speed)
+# Function to fetch a range of days with one call per API
+# (first_day/last_day are day offsets, last_day being the oldest)
+def fetch_range(now, first_day, last_day):
+    print(f"Fetching days {first_day}-{last_day}")
+
+    oldest_day = now - timedelta(days=last_day)
+    newest_day = now - timedelta(days=first_day)
+    start_time = int(oldest_day.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+    end_time = int(newest_day.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()) + 86400
+
+    # API Parameters
+    params_pollution = {
+        "lat": LATITUDE,
+        "lon": LONGITUDE,
+        "start": start_time,
+        "end": end_time,
+        "appid": API_KEY
+    }
+    params_weather = {
+        "latitude": LATITUDE,
+        "longitude": LONGITUDE,
+        "start_date": oldest_day.strftime("%Y-%m-%d"),
+        "end_date": newest_day.strftime("%Y-%m-%d"),
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
+        "timezone": "Asia/Karachi"
     }
+    if HOURLY:
+        # OpenWeather timestamps are UTC, so the hourly weather (and the dates of the
+        # daily aggregates) are requested in GMT to line up on the hour
+        params_weather["hourly"] = ",".join(HOURLY_WEATHER_COLUMNS)
+        params_weather["timezone"] = "GMT"
+
+    return fetch_data(URL_POLLUTION, params_pollution, URL_WEATHER, params_weather)
+
+# Function to split range responses into one row per UTC day (see daily_pollution)
+# (or, in hourly mode, one row per reading)
+def split_range_data(air_data, weather_data, now):
+    if not air_data.get("list") or "daily" not in weather_data or not weather_data["daily"].get("time"):
+        return pd.DataFrame(columns=BACKFILL_COLUMNS)
+    if HOURLY:
+        return split_hourly_data(air_data, weather_data, now)
+
+    with timed("backfill_process_seconds", mode="range"):
+        # Hourly pollution readings reduced to one row per UTC day, as the daily forecast does
+        pollution = daily_pollution(pollution_frame(air_data["list"]))
+        days = join_by_date(pollution, weather_frame(weather_data["daily"]))
+
+        dates = pd.to_datetime(days["readable_time"]).dt.date
+        day_offset = [(now.date() - date).days for date in dates]
+        frame = build_feature_frame(days, air_data["coord"]["lat"], air_data["coord"]["lon"], day_offset)
+    count("backfill_days_fetched_total", len(frame))
+    return frame
+
+def split_hourly_data(air_data, weather_data, now):
+    if not weather_data.get("hourly", {}).get("time"):
+        return pd.DataFrame(columns=BACKFILL_COLUMNS)
+
+    with timed("backfill_process_seconds", mode="hourly"):
+        # Every reading, with its day's weather aggregates and the weather of its hour
+        pollution = pollution_frame(air_data["list"], time_format=HOURLY_FORMAT).drop_duplicates("readable_time")
+        days = join_by_date(pollution, weather_frame(weather_data["daily"]))
+        hours = join_by_timestamp(days, hourly_weather_frame(weather_data["hourly"]))
+
+        day_offset = (pd.Timestamp(now.date()) - pd.to_datetime(hours["date"])).dt.days
+        frame = build_feature_frame(
+            hours, air_data["coord"]["lat"], air_data["coord"]["lon"], day_offset, BACKFILL_COLUMNS, BACKFILL_DTYPES
+        )
+    count("backfill_hours_fetched_total", len(frame))
+    return frame
+
+# Function to list checkpoint files, newest month first
+def checkpoint_paths():
+    return sorted(glob.glob(os.path.join(BACKFILL_CHECKPOINT_DIR, "????-??.parquet")), reverse=True)
+
+# Function to read the days saved in the checkpoint (only the key column is loaded)
+def checkpoint_days():
+    days = set()
+    for path in checkpoint_paths():
+        days.update(pq.read_table(path, columns=["readable_time"])["readable_time"].to_pylist())
+    return days
+
+# Function to merge fetched days into their month files
+def save_checkpoint(data_df):
+    os.makedirs(BACKFILL_CHECKPOINT_DIR, exist_ok=True)
+    for month, month_df in data_df.groupby(data_df["readable_time"].str[:7]):
+        path = os.path.join(BACKFILL_CHECKPOINT_DIR, f"{month}.parquet")
+        if os.path.exists(path):
+            month_df = pd.concat([pd.read_parquet(path), month_df], ignore_index=True)
+        month_df = month_df.drop_duplicates("readable_time", keep="last").sort_values("readable_time", ascending=False)
+        pq.write_table(to_record_table(month_df), f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
 
-    return row, aqi
-
-# Function to fetch historical data and prepare DataFrame
-def fetch_historical_data(day_offset):
-    data_rows = []
-    previous_aqi = None  # Initialize to None before processing
-
-    for i in range(1, day_offset + 1):
-        print('----------------------------------------------------------------------')
-        print(i)
-        print('----------------------------------------------------------------------')
-
-        # Generate timestamps for the day
-        target_day = datetime.now(timezone.utc) - timedelta(days=i)
-        start_time = int(target_day.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
-        end_time = start_time + 86400  # 86400 seconds in a day
-
-        # API Parameters
-        params_pollution = {
-            "lat": LATITUDE,
-            "lon": LONGITUDE,
-            "start": start_time,
-            "end": end_time,
-            "appid": API_KEY
-        }
-        params_weather = {
-            "latitude": LATITUDE,
-            "longitude": LONGITUDE,
-            "start_date": target_day.strftime("%Y-%m-%d"),
-            "end_date": target_day.strftime("%Y-%m-%d"),
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
-            "timezone": "Asia/Karachi"
-        }
-
-        # Fetch data
-        air_data, weather_data = fetch_data(URL_POLLUTION, params_pollution, URL_WEATHER, params_weather)
-
-        # Check data and process
-        if air_data and weather_data and "daily" in weather_data and len(weather_data["daily"]["time"]) > 0:
-            row, previous_aqi = process_data(air_data, weather_data, i, previous_aqi)
-            if row:  
-                data_rows.append(row)
+# Function to move checkpoints written as range parts into month files, one file at a time
+def migrate_checkpoint():
+    month_paths = set(checkpoint_paths())
+    for path in glob.glob(os.path.join(BACKFILL_CHECKPOINT_DIR, "*.parquet")):
+        if path not in month_paths:
+            save_checkpoint(pd.read_parquet(path))
+            os.remove(path)
+
+def to_record_table(data_df):
+    return pa.Table.from_pandas(data_df[BACKFILL_COLUMNS], schema=ROW_SCHEMA, preserve_index=False)
+
+# Function to read the keys (days, or hours in hourly mode) already present in the feature group
+def fetch_stored_days():
+    try:
+        return set(store.read(BACKFILL_FEATURE_GROUP, columns=["readable_time"])["readable_time"])
+    except Exception as e:
+        print(f"Error reading stored days: {e}")
+        return set()
+
+# Function to group day offsets into contiguous chunks of at most BACKFILL_CHUNK_DAYS
+def chunk_day_offsets(day_offsets):
+    chunks = []
+    for i in sorted(day_offsets):
+        if chunks and chunks[-1][1] == i - 1 and i - chunks[-1][0] < BACKFILL_CHUNK_DAYS:
+            chunks[-1] = (chunks[-1][0], i)
         else:
-            print(f"Data missing for day {i}.")
+            chunks.append((i, i))
+    return chunks
 
-    # Return DataFrame only if data_rows is not empty
-    if data_rows:
-        return pd.DataFrame(data_rows)
-    else:
-        print("No valid data found to create a DataFrame.")
-        return pd.DataFrame()  # Return an empty DataFrame if no data
+# Function to fetch every missing day into the checkpoint, chunks concurrently
+def fetch_missing_days(now, day_offset, stored_days=()):
+    migrate_checkpoint()
+
+    # Only fetch days that are neither checkpointed nor already in the feature store
+    # (in hourly mode a day counts once any of its hours is known)
+    known_days = checkpoint_days() | set(stored_days)
+    if HOURLY:
+        known_days = {key[:10] for key in known_days}
+    missing = [
+        i for i in range(1, day_offset + 1)
+        if (now - timedelta(days=i)).strftime("%Y-%m-%d") not in known_days
+    ]
+    chunks = chunk_day_offsets(missing)
+    print(f"{day_offset - len(missing)} days already available, fetching {len(missing)} days in {len(chunks)} chunks")
+
+    # Each chunk is checkpointed as soon as it arrives and then dropped; at most
+    # 2 x BACKFILL_CONCURRENCY chunks are in flight so finished payloads can't pile up
+    pending_chunks = iter(chunks)
+    with ThreadPoolExecutor(max_workers=BACKFILL_CONCURRENCY) as executor:
+        futures = {}
+
+        def submit_next():
+            chunk = next(pending_chunks, None)
+            if chunk is not None:
+                futures[executor.submit(fetch_range, now, *chunk)] = chunk
+
+        for _ in range(2 * BACKFILL_CONCURRENCY):
+            submit_next()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                first_day, last_day = futures.pop(future)
+                submit_next()
+                air_data, weather_data = future.result()
+                if air_data and weather_data:
+                    chunk_df = split_range_data(air_data, weather_data, now)
+                    if not chunk_df.empty:
+                        save_checkpoint(chunk_df)
+                else:
+                    print(f"Data missing for days {first_day}-{last_day}.")
+
+# Generator over the backfilled days as fixed-schema Arrow record batches, oldest day
+# first, one checkpoint month at a time
+def fetch_historical_data(day_offset, stored_days=()):
+    now = datetime.now(timezone.utc)
+    fetch_missing_days(now, day_offset, stored_days)
+
+    oldest = (now - timedelta(days=day_offset)).strftime("%Y-%m-%d")
+    newest = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+    previous_aqi = None
+    for path in reversed(checkpoint_paths()):
+        month_df = pd.read_parquet(path)
+        month_df = month_df[month_df["readable_time"].str[:10].between(oldest, newest)]
+        if month_df.empty:
+            continue
+
+        # Day offsets are relative to this run, not to the run that fetched the day
+        dates = pd.to_datetime(month_df["readable_time"]).dt.date
+        month_df["day_offset"] = [(now.date() - date).days for date in dates]
+        month_df = month_df.sort_values("readable_time", ignore_index=True)
+
+        # AQI change against the previous (older) row in time order, as change_rate computes
+        # it when serving; the last AQI of the previous month carries over
+        aqi = month_df["aqi"] if previous_aqi is None else pd.concat([pd.Series([previous_aqi]), month_df["aqi"]])
+        month_df["aqi_change_rate"] = change_rate(aqi).iloc[-len(month_df):].to_numpy()
+        previous_aqi = month_df["aqi"].iloc[-1]
+
+        for batch in to_record_table(month_df).to_batches():
+            yield batch
+
+def insert_batches(batches):
+    store.insert(
+        BACKFILL_FEATURE_GROUP, pa.Table.from_batches(batches, schema=ROW_SCHEMA).to_pandas(),
+        description=BACKFILL_DESCRIPTION
+    )
+    return sum(batch.num_rows for batch in batches)
+
+# Streams record batches to the CSV output and to the feature store, inserting the rows
+# missing from the store in groups of BACKFILL_INSERT_ROWS
+def write_backfill(batches, stored_days):
+    writer = None
+    pending, pending_rows, total_rows, inserted_rows = [], 0, 0, 0
+    for batch in batches:
+        if writer is None:
+            writer = pa_csv.CSVWriter(BACKFILL_OUTPUT_CSV, ROW_SCHEMA)
+        writer.write_batch(batch)
+        total_rows += batch.num_rows
+
+        # Insert only the days missing from the feature store
+        delta = batch.filter(pa.array([day not in stored_days for day in batch.column("readable_time").to_pylist()]))
+        if delta.num_rows:
+            pending.append(delta)
+            pending_rows += delta.num_rows
+        if pending_rows >= BACKFILL_INSERT_ROWS:
+            inserted_rows += insert_batches(pending)
+            pending, pending_rows = [], 0
+
+    if pending:
+        inserted_rows += insert_batches(pending)
+    if writer is not None:
+        writer.close()
+    return total_rows, inserted_rows
+
+# Function to compute the rolling-window features of the backfilled range in one
+# vectorized pass and seed the hourly ingest's window state with its last week (hourly
+# backfills only: the windows and lags are defined over hourly readings). Only the
+# key and the four pollutant columns are read from the checkpoint, and every row is
+# upserted since a filled gap changes its neighbours' windows too.
+def backfill_rolling_features(day_offset):
+    now = datetime.now(timezone.utc)
+    oldest = (now - timedelta(days=day_offset)).strftime("%Y-%m-%d")
+    newest = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+    columns = ["readable_time"] + ROLLING_POLLUTANTS
+    frames = [pd.read_parquet(path, columns=columns) for path in checkpoint_paths()]
+    readings = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    readings = readings[readings["readable_time"].str[:10].between(oldest, newest)]
+    if readings.empty:
+        return 0
+
+    with timed("backfill_rolling_seconds"):
+        rolling_df = rolling_feature_frame(readings)
+    for start in range(0, len(rolling_df), BACKFILL_INSERT_ROWS):
+        store.insert(
+            ROLLING_FEATURE_GROUP, rolling_df.iloc[start:start + BACKFILL_INSERT_ROWS],
+            description=ROLLING_FEATURE_GROUP_DESCRIPTION
+        )
+
+    # An ingest state newer than the backfill is kept
+    state, seeded = RollingState.load(), RollingState.from_frame(readings)
+    if state.last_time is None or state.last_time < seeded.last_time:
+        seeded.save()
+    return len(rolling_df)
 
 
 # Main Execution
-data_df = fetch_historical_data(400)  # Pass the required day offset
+if __name__ == "__main__":
+    print_summary_at_exit("historical")
 
+    stored_days = fetch_stored_days()
+    insert_skip_days = set() if BACKFILL_REWRITE else stored_days
+    total_rows, inserted_rows = write_backfill(
+        fetch_historical_data(400, stored_days), insert_skip_days  # Pass the required day offset
+    )
+
+    if not total_rows:
+        print("No data to save.")
+    elif inserted_rows:
+        unit = "hours" if HOURLY else "days"
+        print(f"{inserted_rows} historical {unit} successfully inserted into {BACKFILL_FEATURE_GROUP}!")
+    else:
+        print("Feature store already up to date.")
 
-# Ensure that data_df is not None before saving
-if not data_df.empty:
-    data_df.to_csv("aqi_data.csv", index=False)
-    # feature_group = fs.get_feature_group(name="weather_and_pollutant_data", version=1)
-    feature_group.insert(data_df)
-    print("Historical data successfully inserted into the feature store!")
-else:
-    print("No data to save.")
+    rolling_rows = backfill_rolling_features(400) if HOURLY else 0
+    if rolling_rows:
+        print(f"{rolling_rows} rows of rolling features written to {ROLLING_FEATURE_GROUP}")
@@ -0,0 +1,65 @@
+# -----------------------------------------------------------------------------------------------------
+# -------------------------------  Serialized Inference Artifact  -------------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Everything serving needs from training in one file: the fitted scaler, the tuned
+# model, the feature column order and a hash of that schema. Produced by
+# training_pipeline.py and loaded by the backend, so prediction is a single
+# transform + predict on columns in training order.
+
+import hashlib
+import joblib
+
+ARTIFACT_FILE = "aqi_artifact.pkl"
+
+# Models registered before the artifact existed: a bare estimator without scaler
+LEGACY_MODEL_FILE = "rf_model.pkl"
+
+
+def schema_hash(feature_columns):
+    return hashlib.sha256(",".join(feature_columns).encode()).hexdigest()[:16]
+
+
+class InferenceArtifact:
+    def __init__(self, model, feature_columns, scaler=None, metadata=None):
+        self.model = model
+        self.scaler = scaler
+        self.feature_columns = list(feature_columns)
+        self.schema_hash = schema_hash(self.feature_columns)
+        self.metadata = metadata or {}
+
+    def predict(self, frame):
+        x = frame[self.feature_columns].to_numpy(dtype=float)
+        if self.scaler is not None:
+            x = self.scaler.transform(x)
+        return self.model.predict(x)
+
+    def save(self, path=ARTIFACT_FILE):
+        # Stored as a plain dict so loading doesn't depend on this class's import path
+        joblib.dump({
+            "model": self.model,
+            "scaler": self.scaler,
+            "feature_columns": self.feature_columns,
+            "schema_hash": self.schema_hash,
+            "metadata": self.metadata,
+        }, path)
+        return path
+
+
+# Loads an artifact (or a legacy bare estimator) and checks it against the columns serving builds
+def load_artifact(path, expected_columns=None):
+    stored = joblib.load(path)
+    if isinstance(stored, dict):
+        artifact = InferenceArtifact(stored["model"], stored["feature_columns"], stored["scaler"], stored.get("metadata"))
+        if artifact.schema_hash != stored["schema_hash"]:
+            raise ValueError(f"Artifact {path} is corrupt: schema hash does not match its feature columns")
+    else:
+        if expected_columns is None:
+            raise ValueError(f"Legacy model {path} needs expected_columns")
+        artifact = InferenceArtifact(stored, expected_columns)
+
+    if expected_columns is not None and artifact.schema_hash != schema_hash(expected_columns):
+        raise ValueError(
+            f"Artifact {path} was trained on {artifact.feature_columns}, serving builds {list(expected_columns)}"
+        )
+    return artifact
@@ -0,0 +1,145 @@
+# -----------------------------------------------------------------------------------------------------
+# -------------------------------  Metrics and Timing Instrumentation  --------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Process-wide counters and histograms with labels, plus a timed() context manager that
+# records durations in seconds. The backend exposes them in the Prometheus text format
+# on /metrics; the batch scripts print a JSON summary when they finish.
+#
+#   with timed("backfill_fetch_seconds", api="pollution"):
+#       ...
+#   count("feature_store_rows_inserted_total", len(df), backend="local")
+
+import atexit
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a fast in-memory predict to a full training stage
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+_lock = threading.Lock()
+_counters = {}  # name -> {labels: value}
+_histograms = {}  # name -> {labels: [bucket counts..., sum, count, max]}
+_help = {}
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def count(name, amount=1, **labels):
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        state = series.get(key)
+        if state is None:
+            state = series[key] = [0] * len(DEFAULT_BUCKETS) + [0.0, 0, 0.0]
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                state[i] += 1
+        state[-3] += value
+        state[-2] += 1
+        state[-1] = max(state[-1], value)
+
+
+@contextmanager
+def timed(name, **labels):
+    # Failed calls are recorded too, with status="error"
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, status=status, **labels)
+
+
+def _series_name(name, labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+# Prometheus text exposition format (version 0.0.4)
+def prometheus_text():
+    lines = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{_series_name(name, labels)} {value}")
+
+        for name, series in sorted(_histograms.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, state in series.items():
+                for bound, bucket_count in zip(DEFAULT_BUCKETS, state):
+                    lines.append(f"{_series_name(name + '_bucket', labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{_series_name(name + '_bucket', labels, [('le', '+Inf')])} {state[-2]}")
+                lines.append(f"{_series_name(name + '_sum', labels)} {state[-3]}")
+                lines.append(f"{_series_name(name + '_count', labels)} {state[-2]}")
+    return "\n".join(lines) + "\n"
+
+
+# Bucket upper bound below which the given fraction of observations falls
+def _quantile(state, q):
+    target = math.ceil(q * state[-2])
+    for bound, bucket_count in zip(DEFAULT_BUCKETS, state):
+        if bucket_count >= target:
+            return round(min(bound, state[-1]), 4)
+    return round(state[-1], 4)
+
+
+def summary():
+    with _lock:
+        return {
+            "counters": {
+                _series_name(name, labels): value
+                for name, series in _counters.items() for labels, value in series.items()
+            },
+            "timers": {
+                _series_name(name, labels): {
+                    "count": state[-2],
+                    "total": round(state[-3], 4),
+                    "mean": round(state[-3] / state[-2], 4),
+                    "p95_le": _quantile(state, 0.95),
+                    "max": round(state[-1], 4),
+                }
+                for name, series in _histograms.items() for labels, state in series.items()
+            },
+        }
+
+
+def print_summary(script):
+    print(json.dumps({"script": script, "metrics": summary()}, indent=2))
+
+
+# Batch scripts call this once so every exit path (including sys.exit) prints the summary
+def print_summary_at_exit(script):
+    atexit.register(print_summary, script)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------------------------------------------
+# ----------------------------  Rolling-Window Pollutant Features  ------------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Rolling mean, max and standard deviation of pm2_5, pm10, no2 and o3 over the last 24
+# hours and 7 days (the time window (t - window, t], like pandas' rolling("24h")), plus
+# each pollutant's reading 1 and 24 hours earlier, stored per readable_time in the
+# pollutant_rolling_features feature group.
+#
+# The hourly ingest updates them in O(1) per reading from a small JSON state file: the
+# readings inside each window with their running sum and sum of squares, a deque of
+# decreasing values for the max, and the readings of the last day for the lags.
+# Backfills compute the whole range in one vectorized pandas pass and seed that state,
+# so neither path rescans history.
+
+import json
+import math
+import os
+from collections import deque
+import pandas as pd
+
+ROLLING_POLLUTANTS = ["pm2_5", "pm10", "no2", "o3"]
+ROLLING_WINDOWS = {"24h": 24 * 3600, "7d": 7 * 24 * 3600}
+ROLLING_LAGS = {"1h": 3600, "24h": 24 * 3600}
+ROLLING_STATS = ["mean", "max", "std"]
+
+ROLLING_COLUMNS = (
+    ["readable_time"]
+    + [f"{pollutant}_{stat}_{window}"
+       for window in ROLLING_WINDOWS for stat in ROLLING_STATS for pollutant in ROLLING_POLLUTANTS]
+    + [f"{pollutant}_lag_{lag}" for lag in ROLLING_LAGS for pollutant in ROLLING_POLLUTANTS]
+)
+ROLLING_DTYPES = {column: float for column in ROLLING_COLUMNS[1:]}
+
+ROLLING_STATE_FILE = os.getenv("ROLLING_STATE_FILE", "rolling_state.json")
+
+# Rolling rows waiting for the next flush when the ingest runs with INGEST_MODE=buffered
+ROLLING_BUFFER_FILE = os.getenv("ROLLING_BUFFER_FILE", "rolling_buffer.jsonl")
+
+
+# readable_time (a date or a timestamp string) -> seconds, naive times taken as UTC
+def _seconds(readable_time):
+    return pd.Timestamp(readable_time).timestamp()
+
+
+class RollingWindow:
+    def __init__(self, seconds, readings=(), maxima=(), total=0.0, squares=0.0):
+        self.seconds = seconds
+        self.readings = deque(tuple(reading) for reading in readings)  # (time, value), oldest first
+        self.maxima = deque(tuple(reading) for reading in maxima)  # (time, value), values decreasing
+        self.total = total
+        self.squares = squares
+
+    def push(self, time, value):
+        self.readings.append((time, value))
+        self.total += value
+        self.squares += value * value
+        # Older readings no larger than the new one can never be the max again
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((time, value))
+        self.expire(time)
+
+    def expire(self, now):
+        start = now - self.seconds
+        while self.readings and self.readings[0][0] <= start:
+            _, value = self.readings.popleft()
+            self.total -= value
+            self.squares -= value * value
+        while self.maxima and self.maxima[0][0] <= start:
+            self.maxima.popleft()
+        if not self.readings:
+            # Drop accumulated rounding error whenever the window empties
+            self.total = self.squares = 0.0
+
+    def stats(self):
+        count = len(self.readings)
+        if not count:
+            return {"mean": None, "max": None, "std": None}
+        mean = self.total / count
+        # Sample standard deviation (ddof=1), as pandas computes it
+        std = math.sqrt(max(self.squares - count * mean * mean, 0.0) / (count - 1)) if count > 1 else None
+        return {"mean": mean, "max": self.maxima[0][1], "std": std}
+
+    def to_dict(self):
+        return {
+            "readings": list(self.readings), "maxima": list(self.maxima), "total": self.total, "squares": self.squares
+        }
+
+
+class RollingState:
+    def __init__(self, last_time=None, windows=None, recent=None):
+        self.last_time = last_time
+        self.windows = {
+            (pollutant, window): RollingWindow(seconds, **(windows or {}).get(f"{pollutant}:{window}", {}))
+            for pollutant in ROLLING_POLLUTANTS for window, seconds in ROLLING_WINDOWS.items()
+        }
+        self.recent = {time: values for time, values in (recent or [])}  # time -> readings, for the lags
+
+    @classmethod
+    def load(cls, path=ROLLING_STATE_FILE):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def save(self, path=ROLLING_STATE_FILE):
+        state = {
+            "last_time": self.last_time,
+            "windows": {f"{pollutant}:{window}": w.to_dict() for (pollutant, window), w in self.windows.items()},
+            "recent": list(self.recent.items()),
+        }
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    # Adds one reading and returns its feature row. A reading at or before the last one
+    # (a repeated run) leaves the state alone and gets the features as of that state.
+    def update(self, readable_time, values):
+        time = _seconds(readable_time)
+        if self.last_time is None or time > self.last_time:
+            for (pollutant, _), window in self.windows.items():
+                window.push(time, float(values[pollutant]))
+            self.recent[time] = {pollutant: float(values[pollutant]) for pollutant in ROLLING_POLLUTANTS}
+            # Times arrive in order, so the oldest entries are first
+            oldest = time - max(ROLLING_LAGS.values())
+            while next(iter(self.recent)) < oldest:
+                del self.recent[next(iter(self.recent))]
+            self.last_time = time
+
+        row = {"readable_time": readable_time}
+        for (pollutant, window_name), window in self.windows.items():
+            for stat, value in window.stats().items():
+                row[f"{pollutant}_{stat}_{window_name}"] = value
+        for lag, seconds in ROLLING_LAGS.items():
+            lagged = self.recent.get(time - seconds, {})
+            for pollutant in ROLLING_POLLUTANTS:
+                row[f"{pollutant}_lag_{lag}"] = lagged.get(pollutant)
+        return row
+
+    # Feature rows for the readings of a feature frame, oldest first
+    def update_frame(self, frame):
+        frame = frame.sort_values("readable_time")
+        rows = [self.update(readable_time, values) for readable_time, values in
+                zip(frame["readable_time"], frame[ROLLING_POLLUTANTS].to_dict(orient="records"))]
+        return pd.DataFrame(rows, columns=ROLLING_COLUMNS).astype(ROLLING_DTYPES)
+
+    # State after the readings of a (backfilled) frame, replaying only the span the
+    # windows and lags still need
+    @classmethod
+    def from_frame(cls, frame):
+        state = cls()
+        if frame.empty:
+            return state
+        times = pd.to_datetime(frame["readable_time"])
+        span = pd.Timedelta(seconds=max(max(ROLLING_WINDOWS.values()), max(ROLLING_LAGS.values())))
+        state.update_frame(frame[times > times.max() - span])
+        return state
+
+
+# Feature rows for a whole frame of readings in one vectorized pass (backfills)
+def rolling_feature_frame(frame):
+    times = pd.to_datetime(frame["readable_time"])
+    frame, times = frame[~times.duplicated(keep="last")], times[~times.duplicated(keep="last")]
+    order = times.argsort(kind="stable")
+    readings = frame[ROLLING_POLLUTANTS].astype(float).iloc[order].set_axis(times.iloc[order])
+
+    features = {"readable_time": frame["readable_time"].iloc[order].to_numpy()}
+    for window, seconds in ROLLING_WINDOWS.items():
+        rolling = readings.rolling(pd.Timedelta(seconds=seconds))
+        for stat, values in (("mean", rolling.mean()), ("max", rolling.max()), ("std", rolling.std())):
+            for pollutant in ROLLING_POLLUTANTS:
+                features[f"{pollutant}_{stat}_{window}"] = values[pollutant].to_numpy()
+    for lag, seconds in ROLLING_LAGS.items():
+        lagged = readings.reindex(readings.index - pd.Timedelta(seconds=seconds))
+        for pollutant in ROLLING_POLLUTANTS:
+            features[f"{pollutant}_lag_{lag}"] = lagged[pollutant].to_numpy()
+    return pd.DataFrame(features, columns=ROLLING_COLUMNS).astype(ROLLING_DTYPES)
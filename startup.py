@@ -0,0 +1,39 @@
+# -----------------------------------------------------------------------------------------------------
+# ------------------------------------  Startup Time Report  ------------------------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Records named startup milestones in seconds since the process started (interpreter
+# startup included, read from /proc where available). Entry points import this module
+# first and call mark() after their imports and once they are ready to work.
+
+import os
+import time
+
+
+def _process_age():
+    # starttime is field 22 of /proc/self/stat, in clock ticks since boot
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+_start = time.perf_counter() - _process_age()
+_milestones = {"interpreter": round(time.perf_counter() - _start, 3)}
+
+
+def mark(name):
+    _milestones[name] = round(time.perf_counter() - _start, 3)
+    return _milestones[name]
+
+
+def report():
+    return dict(_milestones)
+
+
+def print_report():
+    print("Startup (s since process start):", ", ".join(f"{name}={seconds}" for name, seconds in _milestones.items()))
@@ -0,0 +1,36 @@
+import json
+
+import pandas as pd
+import pytest
+
+from backtest import backtest_lines
+from feature_store import FEATURE_GROUP, LocalStore
+from features import ROW_COLUMNS
+
+
+class NoPredictModel:
+    def predict(self, features):
+        raise AssertionError("nothing to predict in an empty range")
+
+
+def summary_only(store):
+    lines = list(backtest_lines(store, NoPredictModel(), "2024-01-01", "2024-03-01", source="store"))
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(directory=str(tmp_path / "feature_store"), registry_dir=str(tmp_path / "registry"))
+
+
+def test_backtest_without_feature_group(store):
+    summary = summary_only(store)
+    assert summary["scores"] == {"overall": None, "day_of_week": {}, "month": {}}
+
+
+def test_backtest_with_no_rows_in_range(store):
+    row = {column: 0 for column in ROW_COLUMNS}
+    row["readable_time"] = "2025-06-01"
+    store.insert(FEATURE_GROUP, pd.DataFrame([row]))
+    assert summary_only(store)["scores"]["overall"] is None
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from features import POLLUTANTS, assemble_forecast
+
+
+def readings(start, hours):
+    first = int(pd.Timestamp(start).timestamp())
+    return [
+        {"dt": first + hour * 3600, "main": {"aqi": 1 + hour % 5},
+         "components": {pollutant: float(hour + i) for i, pollutant in enumerate(POLLUTANTS)}}
+        for hour in range(hours)
+    ]
+
+
+def daily_weather(first_date, days):
+    dates = pd.date_range(first_date, periods=days).strftime("%Y-%m-%d").tolist()
+    return {"time": dates, "temperature_2m_max": [30.0] * days, "temperature_2m_min": [20.0] * days,
+            "precipitation_sum": [0.0] * days, "windspeed_10m_max": [10.0] * days}
+
+
+def test_day_offsets_start_at_one_when_the_first_date_has_no_weather():
+    # Late in the UTC day: the first pollution date has no weather day
+    days, day_offset = assemble_forecast(readings("2024-06-10 20:00", 96), daily_weather("2024-06-11", 7), 3)
+    assert days["date"].tolist() == ["2024-06-11", "2024-06-12", "2024-06-13"]
+    assert day_offset.tolist() == [1, 2, 3]
+
+    days, day_offset = assemble_forecast(readings("2024-06-10 20:00", 96), daily_weather("2024-06-11", 7), 1)
+    assert day_offset.tolist() == [1]
+
+
+def test_hourly_forecast_keeps_every_reading_of_the_requested_days():
+    days, day_offset = assemble_forecast(
+        readings("2024-06-10 20:00", 96), daily_weather("2024-06-10", 7), 2, resolution="hourly"
+    )
+    assert len(days) == 4 + 24
+    assert day_offset.tolist() == [1] * 4 + [2] * 24
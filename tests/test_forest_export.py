@@ -0,0 +1,49 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from features import FEATURE_COLUMNS
+from forest_export import export_forest, load_forest
+from inference_artifact import InferenceArtifact
+
+
+@pytest.fixture
+def artifact():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.normal(size=(400, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    target = frame["pm2_5"] * 3 + frame["hour"] - frame["max_temp"] ** 2 + rng.normal(size=len(frame))
+    scaler = StandardScaler().fit(frame.to_numpy())
+    model = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0)
+    model.fit(scaler.transform(frame.to_numpy()), target)
+    return InferenceArtifact(model, FEATURE_COLUMNS, scaler)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_exported_forest_predicts_like_sklearn(artifact, tmp_path, mmap):
+    forest = load_forest(export_forest(artifact, str(tmp_path / "forest")), mmap=mmap, expected_columns=FEATURE_COLUMNS)
+
+    rows = pd.DataFrame(np.random.default_rng(1).normal(size=(5000, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    np.testing.assert_allclose(forest.predict(rows), artifact.predict(rows), rtol=0, atol=1e-9)
+    assert len(forest.predict(rows.iloc[:0])) == 0
+
+
+def test_load_forest_rejects_other_feature_columns(artifact, tmp_path):
+    directory = export_forest(artifact, str(tmp_path / "forest"))
+    with pytest.raises(ValueError, match="serving builds"):
+        load_forest(directory, expected_columns=list(reversed(FEATURE_COLUMNS)))
+
+
+def test_load_forest_rejects_a_corrupt_schema(artifact, tmp_path):
+    directory = export_forest(artifact, str(tmp_path / "forest"))
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    meta["feature_columns"] = meta["feature_columns"][:-1]
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    with pytest.raises(ValueError, match="corrupt"):
+        load_forest(directory)
@@ -0,0 +1,206 @@
+import importlib
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from feature_store import LocalStore
+from features import POLLUTANTS, ROW_COLUMNS, ROW_DTYPES, assemble_forecast, build_feature_frame
+
+DAYS = 70
+
+
+# Stand-in for historical.fetch_range: deterministic hourly readings (every 7th hour
+# missing, so some days start after 00:00) and daily weather for the requested days
+class FakeApi:
+    def __init__(self):
+        self.calls = []
+        self.now = None
+
+    def __call__(self, now, first_day, last_day):
+        self.calls.append((first_day, last_day))
+        self.now = now
+        oldest = (now - timedelta(days=last_day)).replace(hour=0, minute=0, second=0, microsecond=0)
+        days = last_day - first_day + 1
+        hours = [int(oldest.timestamp()) // 3600 + h for h in range(days * 24)]
+        air = {"coord": {"lat": 24.8607, "lon": 67.0011}, "list": [
+            {"dt": hour * 3600, "main": {"aqi": 1 + hour % 5},
+             "components": {pollutant: float((hour + i) % 50) for i, pollutant in enumerate(POLLUTANTS)}}
+            for hour in hours if hour % 7 != 3
+        ]}
+        dates = [(oldest + timedelta(days=i)).date() for i in range(days)]
+        weather = {
+            "daily": {
+                "time": [date.isoformat() for date in dates],
+                "temperature_2m_max": [20.0 + date.toordinal() % 10 for date in dates],
+                "temperature_2m_min": [10.0 + date.toordinal() % 7 for date in dates],
+                "precipitation_sum": [None if date.toordinal() % 5 == 0 else 0.5 for date in dates],
+                "windspeed_10m_max": [float(date.toordinal() % 13) for date in dates],
+            },
+            "hourly": {
+                "time": [
+                    datetime.fromtimestamp(hour * 3600, timezone.utc).strftime("%Y-%m-%dT%H:%M") for hour in hours
+                ],
+                "temperature_2m": [float(hour % 30) for hour in hours],
+                "relative_humidity_2m": [float(hour % 100) for hour in hours],
+                "precipitation": [None if hour % 11 == 0 else 0.1 for hour in hours],
+                "windspeed_10m": [float(hour % 17) for hour in hours],
+            },
+        }
+        return air, weather
+
+
+def load_historical(monkeypatch, tmp_path, mode):
+    monkeypatch.setenv("BACKFILL_MODE", mode)
+    sys.modules.pop("historical", None)
+    historical = importlib.import_module("historical")
+    monkeypatch.setattr(historical, "store", LocalStore(directory=str(tmp_path / "feature_store")))
+    monkeypatch.setattr(historical, "BACKFILL_CHECKPOINT_DIR", str(tmp_path / "checkpoint"))
+    monkeypatch.setattr(historical, "BACKFILL_OUTPUT_CSV", str(tmp_path / "backfill.csv"))
+    monkeypatch.setattr(historical, "BACKFILL_INSERT_ROWS", 25)
+    api = FakeApi()
+    monkeypatch.setattr(historical, "fetch_range", api)
+    return historical, api
+
+
+def backfill(historical, stored_days=frozenset()):
+    return historical.write_backfill(historical.fetch_historical_data(DAYS, stored_days), stored_days)
+
+
+def stored_rows(historical):
+    return historical.store.read(historical.BACKFILL_FEATURE_GROUP).sort_values("readable_time", ignore_index=True)
+
+
+def no_refetch(now, first_day, last_day):
+    raise AssertionError(f"days {first_day}-{last_day} fetched again")
+
+
+# The daily rows as the per-day backfill built them: the first reading of each UTC day
+# with that day's weather, and the AQI change against the previous day
+def expected_daily_rows(api):
+    first_readings = {}
+    for first_day, last_day in api.calls:
+        air, weather = FakeApi()(api.now, first_day, last_day)
+        daily = weather["daily"]
+        for reading in air["list"]:
+            date = datetime.fromtimestamp(reading["dt"], timezone.utc).date()
+            if date not in first_readings or reading["dt"] < first_readings[date][0]["dt"]:
+                index = daily["time"].index(date.isoformat())
+                first_readings[date] = reading, {name: values[index] for name, values in daily.items()}
+
+    rows, previous_aqi = [], None
+    for date in sorted(first_readings):
+        reading, daily = first_readings[date]
+        time = datetime.fromtimestamp(reading["dt"], timezone.utc)
+        aqi = reading["main"]["aqi"]
+        rows.append({
+            "readable_time": date.isoformat(), "day_offset": (api.now.date() - date).days,
+            "hour": time.hour, "day": time.day, "month": time.month, "latitude": 24.8607, "longitude": 67.0011,
+            "aqi": aqi, "aqi_change_rate": 0 if previous_aqi is None else aqi - previous_aqi,
+            **reading["components"],
+            "max_temp": daily["temperature_2m_max"], "min_temp": daily["temperature_2m_min"],
+            "precipitation": daily["precipitation_sum"] or 0.0, "max_wind_speed": daily["windspeed_10m_max"],
+        })
+        previous_aqi = aqi
+    return pd.DataFrame(rows, columns=ROW_COLUMNS).astype(ROW_DTYPES)
+
+
+def test_daily_backfill_rows(monkeypatch, tmp_path):
+    historical, api = load_historical(monkeypatch, tmp_path, "daily")
+    inserts = []
+    insert = historical.store.insert
+
+    def counted_insert(name, df, **kwargs):
+        inserts.append(len(df))
+        insert(name, df, **kwargs)
+
+    monkeypatch.setattr(historical.store, "insert", counted_insert)
+
+    total_rows, inserted_rows = backfill(historical)
+
+    expected = expected_daily_rows(api)
+    assert len(expected) == DAYS
+    assert (total_rows, inserted_rows) == (DAYS, DAYS)
+    # Ranges rather than one call per day, and inserts in groups of BACKFILL_INSERT_ROWS
+    assert len(api.calls) == -(-DAYS // historical.BACKFILL_CHUNK_DAYS)
+    assert len(inserts) > 1 and sum(inserts) == DAYS
+    pd.testing.assert_frame_equal(stored_rows(historical)[ROW_COLUMNS].astype(ROW_DTYPES), expected)
+
+    # The streamed CSV holds the same rows, oldest first
+    csv_rows = pd.read_csv(tmp_path / "backfill.csv", dtype={"readable_time": str})
+    pd.testing.assert_frame_equal(csv_rows[ROW_COLUMNS].astype(ROW_DTYPES), expected)
+
+
+def test_daily_backfill_resumes_from_checkpoint(monkeypatch, tmp_path):
+    historical, api = load_historical(monkeypatch, tmp_path, "daily")
+    backfill(historical)
+    expected = stored_rows(historical)
+
+    # A rerun with everything checkpointed and stored fetches and inserts nothing
+    monkeypatch.setattr(historical, "fetch_range", no_refetch)
+    stored_days = set(expected["readable_time"])
+    assert backfill(historical, stored_days) == (DAYS, 0)
+
+    # A lost checkpoint month is fetched again for the days the store doesn't have
+    paths = historical.checkpoint_paths()
+    assert len(paths) > 1
+    lost_days = set(pd.read_parquet(paths[-1])["readable_time"])
+    os.remove(paths[-1])
+    monkeypatch.setattr(historical, "fetch_range", api)
+    api.calls.clear()
+    total_rows, inserted_rows = backfill(historical, stored_days - lost_days)
+
+    fetched_days = {
+        (api.now - timedelta(days=offset)).strftime("%Y-%m-%d")
+        for first_day, last_day in api.calls for offset in range(first_day, last_day + 1)
+    }
+    assert fetched_days == lost_days
+    assert (total_rows, inserted_rows) == (DAYS, len(lost_days))
+    pd.testing.assert_frame_equal(stored_rows(historical), expected)
+
+
+def test_hourly_backfill_keeps_every_reading(monkeypatch, tmp_path):
+    historical, api = load_historical(monkeypatch, tmp_path, "hourly")
+    total_rows, inserted_rows = backfill(historical)
+
+    rows = stored_rows(historical)
+    readings = [
+        reading for first_day, last_day in api.calls for reading in FakeApi()(api.now, first_day, last_day)[0]["list"]
+    ]
+    assert total_rows == inserted_rows == len(rows) == len(readings)
+    assert list(rows.columns) == historical.HOURLY_ROW_COLUMNS
+
+    hours = pd.to_datetime(rows["readable_time"]).astype("int64") // 10**9 // 3600
+    assert (rows["temperature"] == hours % 30).all()
+    assert (rows["humidity"] == hours % 100).all()
+    assert (rows["hourly_precipitation"] == (hours % 11 != 0) * 0.1).all()
+    assert (rows["aqi"] == 1 + hours % 5).all()
+    assert (rows["aqi_change_rate"] == rows["aqi"].diff().fillna(0)).all()
+
+    # A rerun finds every day in the checkpoint
+    monkeypatch.setattr(historical, "fetch_range", no_refetch)
+    assert backfill(historical, set(rows["readable_time"])) == (len(rows), 0)
+
+
+def test_daily_backfill_does_not_count_hourly_keys_as_days(monkeypatch, tmp_path):
+    historical, api = load_historical(monkeypatch, tmp_path, "daily")
+    # Rows of the hourly ingest in the daily feature group
+    stored_days = {(datetime.now(timezone.utc) - timedelta(days=offset)).strftime("%Y-%m-%d 05:00:00")
+                   for offset in range(1, DAYS + 1)}
+    total_rows, inserted_rows = backfill(historical, stored_days)
+    assert total_rows == inserted_rows == DAYS
+
+
+def test_daily_backfill_and_forecast_build_the_same_rows(monkeypatch, tmp_path):
+    historical, api = load_historical(monkeypatch, tmp_path, "daily")
+    now = datetime.now(timezone.utc)
+    air, weather = api(now, 1, 5)
+
+    backfilled = historical.split_range_data(air, weather, now)
+    days, day_offset = assemble_forecast(air["list"], weather["daily"], 5)
+    forecast = build_feature_frame(days, air["coord"]["lat"], air["coord"]["lon"], day_offset)
+
+    columns = [column for column in ROW_COLUMNS if column != "day_offset"]
+    assert len(backfilled) == 5
+    pd.testing.assert_frame_equal(backfilled[columns], forecast[columns])
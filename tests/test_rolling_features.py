@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from rolling_features import ROLLING_COLUMNS, ROLLING_POLLUTANTS, RollingState, rolling_feature_frame
+
+
+# Three weeks of hourly readings with single missing hours and a two-day outage
+def hourly_readings():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2024-03-01", periods=21 * 24, freq="h")
+    times = times[(np.arange(len(times)) % 17 != 5) & ((times < "2024-03-09") | (times >= "2024-03-11"))]
+    frame = pd.DataFrame({pollutant: rng.gamma(2.0, 20.0, len(times)) for pollutant in ROLLING_POLLUTANTS})
+    frame.insert(0, "readable_time", times.strftime("%Y-%m-%d %H:%M:%S"))
+    return frame
+
+
+def assert_same_features(actual, expected):
+    assert list(actual.columns) == ROLLING_COLUMNS
+    assert actual["readable_time"].tolist() == expected["readable_time"].tolist()
+    np.testing.assert_allclose(
+        actual[ROLLING_COLUMNS[1:]].to_numpy(dtype=float), expected[ROLLING_COLUMNS[1:]].to_numpy(dtype=float),
+        rtol=0, atol=1e-9
+    )
+
+
+def test_incremental_state_matches_vectorized_pass_across_a_restart(tmp_path):
+    readings = hourly_readings()
+    expected = rolling_feature_frame(readings)
+
+    # First half through one state, saved and reloaded, the rest through the reloaded state
+    half = len(readings) // 2
+    path = str(tmp_path / "rolling_state.json")
+    state = RollingState()
+    first = state.update_frame(readings.iloc[:half])
+    state.save(path)
+    second = RollingState.load(path).update_frame(readings.iloc[half:])
+
+    assert_same_features(pd.concat([first, second], ignore_index=True), expected)
+
+
+def test_state_seeded_from_a_backfill_continues_like_the_vectorized_pass():
+    readings = hourly_readings()
+    expected = rolling_feature_frame(readings)
+
+    backfilled = len(readings) - 48
+    state = RollingState.from_frame(readings.iloc[:backfilled])
+    assert_same_features(state.update_frame(readings.iloc[backfilled:]), expected.iloc[backfilled:])
+
+
+def test_repeated_readings_leave_the_state_alone():
+    readings = hourly_readings()
+    state = RollingState()
+    rows = state.update_frame(readings)
+    last_time = state.last_time
+
+    # A rerun of the last hour gets its features again without being counted twice
+    repeated = state.update_frame(readings.iloc[-1:])
+    assert state.last_time == last_time
+    assert_same_features(repeated, rows.iloc[-1:].reset_index(drop=True))
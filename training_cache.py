@@ -0,0 +1,141 @@
+# -----------------------------------------------------------------------------------------------------
+# ----------------------------  Incremental Training Cache and Drift Check  ---------------------------
+# -----------------------------------------------------------------------------------------------------
+
+# Keeps the training frame in a local Parquet file so a daily run only pulls feature
+# group rows newer than the cached readable_time watermark. What the last trained model
+# has seen (its own watermark, feature statistics and holdout MAE) is stored in the
+# registered artifact's metadata, so any runner can load the latest registered model and
+# decide whether to skip, warm-start the forest with more trees, or retrain.
+
+import math
+import os
+import numpy as np
+import pandas as pd
+from feature_store import FEATURE_GROUP
+from features import FEATURE_COLUMNS
+from inference_artifact import ARTIFACT_FILE, load_artifact
+
+TRAINING_MODE = os.getenv("TRAINING_MODE", "full")  # full or incremental
+TRAINING_CACHE_DIR = os.getenv("TRAINING_CACHE_DIR", "training_cache")
+TRAINING_CACHE_FILE = "training_data.parquet"
+
+# Where registered models are downloaded to for the incremental check
+TRAINING_MODEL_CACHE_DIR = os.getenv("TRAINING_MODEL_CACHE_DIR", os.path.join(TRAINING_CACHE_DIR, "models"))
+
+# Drift thresholds: largest feature mean shift (in training standard deviations) and
+# relative MAE increase on new rows that still count as "no change"
+TRAIN_DRIFT_THRESHOLD = float(os.getenv("TRAIN_DRIFT_THRESHOLD", 0.25))
+TRAIN_ERROR_TOLERANCE = float(os.getenv("TRAIN_ERROR_TOLERANCE", 0.1))
+
+# New rows needed before an incremental run does anything; fewer are left for the next run
+TRAIN_MIN_NEW_ROWS = int(os.getenv("TRAIN_MIN_NEW_ROWS", 24))
+
+# Trees added per warm start are proportional to the new rows, with this floor,
+# and a forest that would grow past TRAIN_MAX_TREES is retrained from scratch instead
+TRAIN_MIN_NEW_TREES = int(os.getenv("TRAIN_MIN_NEW_TREES", 10))
+TRAIN_MAX_TREES = int(os.getenv("TRAIN_MAX_TREES", 2000))
+
+
+def _path(name):
+    return os.path.join(TRAINING_CACHE_DIR, name)
+
+
+# Full table on the first (or a full) run, otherwise the cache plus rows from its watermark on
+def load_training_frame(store, incremental=False):
+    cache_path = _path(TRAINING_CACHE_FILE)
+    if incremental and os.path.exists(cache_path):
+        cached = pd.read_parquet(cache_path)
+        watermark = cached["readable_time"].max()
+        delta = store.read_range(FEATURE_GROUP, start=watermark)
+        delta = delta[delta["readable_time"] > watermark]
+        print(f"Training cache: {len(cached)} rows up to {watermark}, {len(delta)} new rows")
+        if delta.empty:
+            return cached
+        data = pd.concat([cached, delta[cached.columns]], ignore_index=True)
+    else:
+        data = store.read(FEATURE_GROUP)
+        print(f"Read {len(data)} rows from {FEATURE_GROUP} in the {store} feature store")
+
+    data = data.drop_duplicates("readable_time", keep="last").sort_values("readable_time", ignore_index=True)
+    os.makedirs(TRAINING_CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+    return data
+
+
+# Latest registered artifact and its training state, or None (with the reason printed)
+# when an incremental run has nothing to build on and has to retrain in full
+def load_registered_state(store, model_name):
+    try:
+        version = store.latest_model_version(model_name)
+    except (FileNotFoundError, ValueError):
+        print(f"Incremental training: no registered {model_name} model, falling back to a full retrain")
+        return None
+
+    path = os.path.join(store.model_dir(model_name, version, TRAINING_MODEL_CACHE_DIR), ARTIFACT_FILE)
+    if not os.path.exists(path):
+        print(f"Incremental training: {model_name} version {version} has no {ARTIFACT_FILE}, "
+              f"falling back to a full retrain")
+        return None
+    artifact = load_artifact(path, expected_columns=FEATURE_COLUMNS)
+    state = artifact.metadata.get("training_state")
+    if state is None:
+        print(f"Incremental training: {model_name} version {version} has no training state in its metadata, "
+              f"falling back to a full retrain")
+        return None
+    print(f"Incremental training: building on {model_name} version {version}, trained through "
+          f"{state['trained_through']}")
+    return artifact, state
+
+
+# What the model has been trained on, for the next run's drift check
+def training_state(data, mae, n_trees):
+    features = data[FEATURE_COLUMNS]
+    return {
+        "trained_through": data["readable_time"].max(),
+        "n_rows": len(data),
+        "n_trees": n_trees,
+        "mae": float(mae),
+        "feature_mean": features.mean().tolist(),
+        "feature_std": features.std().fillna(0).tolist(),
+    }
+
+
+def drift_report(state, model_mae, new_rows):
+    mean = np.array(state["feature_mean"])
+    std = np.array(state["feature_std"])
+    std[std == 0] = 1.0
+    shift = np.abs(new_rows[FEATURE_COLUMNS].mean().to_numpy() - mean) / std
+    return {
+        "new_rows": len(new_rows),
+        "max_mean_shift": float(shift.max()),
+        "shifted_features": [column for column, s in zip(FEATURE_COLUMNS, shift) if s > TRAIN_DRIFT_THRESHOLD],
+        "new_rows_mae": float(model_mae),
+        "baseline_mae": state["mae"],
+    }
+
+
+# "wait" (too few new rows), "skip" (no drift), "update" (warm start) or "retrain"
+def incremental_decision(state, report):
+    if report["new_rows"] < TRAIN_MIN_NEW_ROWS:
+        return "wait"
+    error_increase = report["new_rows_mae"] > report["baseline_mae"] * (1 + TRAIN_ERROR_TOLERANCE)
+    if not report["shifted_features"] and not error_increase:
+        return "skip"
+    if state["n_trees"] + trees_to_add(state, report["new_rows"]) > TRAIN_MAX_TREES:
+        return "retrain"
+    return "update"
+
+
+def trees_to_add(state, new_rows):
+    return max(TRAIN_MIN_NEW_TREES, math.ceil(state["n_trees"] * new_rows / state["n_rows"]))
+
+
+# Grows a fitted forest by n_new_trees trained only on (x, y); existing trees are untouched
+def warm_start_forest(model, x, y, n_new_trees):
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_new_trees)
+    model.fit(x, y)
+    model.set_params(warm_start=False)
+    return model
@@ -6,20 +6,18 @@
 # -----------------------------------------------------------------------------------------------------
 
 import os
-import hopsworks
+import sys
+from feature_store import get_store
+from instrumentation import observe, print_summary_at_exit
+from training_cache import TRAINING_MODE, load_training_frame
 
-hopsworks_api_key = os.getenv("HOPSWORKS_API_KEY")
+# Feature store selected by FEATURE_STORE_BACKEND; Hopsworks logs in on first use
+store = get_store()
+print_summary_at_exit("training_pipeline")
 
-# Fetching Data From Hopswork
-project = hopsworks.login(api_key_value=hopsworks_api_key) 
-
-fs = project.get_feature_store()  # Access the feature store
-
-# Get the Feature Group
-feature_group = fs.get_feature_group(name="weather_and_pollutant_data", version=1)
-
-# Fetch the data from the Feature Group
-data = feature_group.read()
+# Fetch the data from the Feature Group: the whole table, or in incremental mode
+# the local training cache plus only the rows newer than its watermark
+data = load_training_frame(store, incremental=TRAINING_MODE == "incremental")
 
 # Check its type
 print(type(data))  # Ensure whether it's Pandas
@@ -30,19 +28,126 @@ print(type(data))  # Ensure whether it's Pandas
 # -----------------------------------------------------------------------------------------------------------
 
 
-import pandas as pd
+import time
+from contextlib import contextmanager
 import numpy as np
+from joblib import parallel_backend
+from features import FEATURE_COLUMNS
+from inference_artifact import ARTIFACT_FILE, InferenceArtifact
+from forest_export import FOREST_DIR, export_forest
+from training_cache import (
+    drift_report, incremental_decision, load_registered_state, trees_to_add, training_state, warm_start_forest
+)
 
-data['precipitation'].fillna(0, inplace=True)
+MODEL_NAME = "random_forest"
+
+# Directory registered in the Model Registry: the pickled artifact plus its compact forest export
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", "model_export")
+
+# Parallel training settings
+TRAIN_N_JOBS = int(os.getenv("TRAIN_N_JOBS", -1))  # -1 uses all cores
+TRAIN_BACKEND = os.getenv("TRAIN_BACKEND", "loky")  # joblib backend: loky, multiprocessing or threading
+TRAIN_SEARCH = os.getenv("TRAIN_SEARCH", "random")  # random or halving (successive halving)
+TRAIN_SEARCH_ITER = int(os.getenv("TRAIN_SEARCH_ITER", 10))
+TRAIN_CV_FOLDS = int(os.getenv("TRAIN_CV_FOLDS", 5))
+
+# Wall time of every training stage
+stage_times = {}
+
+@contextmanager
+def timed_stage(name):
+    start = time.perf_counter()
+    yield
+    stage_times[name] = time.perf_counter() - start
+    observe("training_stage_seconds", stage_times[name], stage=name)
+    print(f"[{name}] {stage_times[name]:.2f}s")
 
-df = data.drop(['readable_time', 'day_offset', 'latitude', 'longitude'], axis=1)
+data['precipitation'].fillna(0, inplace=True)
 
 import warnings
 warnings.filterwarnings('ignore')
 
-# features (x) and target (y)
-features = df.drop(df.columns[3], axis=1)
-target = df.iloc[:, 3]
+from sklearn import metrics
+from sklearn.model_selection import train_test_split
+
+
+# Saves the artifact and its compact forest export, and registers both in the Model Registry
+def save_and_register(artifact, model_metrics, description):
+    os.makedirs(MODEL_EXPORT_DIR, exist_ok=True)
+    artifact.save(os.path.join(MODEL_EXPORT_DIR, ARTIFACT_FILE))
+
+    # Same artifact as flat memory-mappable arrays, for fast downloads and backend cold starts
+    export_forest(artifact, os.path.join(MODEL_EXPORT_DIR, FOREST_DIR))
+
+    # Create a new model entry in the Model Registry and save the export directory to it
+    store.save_model(MODEL_NAME, MODEL_EXPORT_DIR, model_metrics, description)
+
+
+# -----------------------------------------------------------------------------------------------------------
+# ---------------------------------------  Incremental Update  ----------------------------------------------
+# -----------------------------------------------------------------------------------------------------------
+
+# Compares the rows that arrived since the latest registered model was trained against
+# what it was trained on (the training state in its metadata), then waits, skips, adds
+# trees, or falls through to a full retrain
+registered = load_registered_state(store, MODEL_NAME) if TRAINING_MODE == "incremental" else None
+if registered is not None:
+    previous, state = registered
+    new_rows = data[data['readable_time'] > state['trained_through']]
+
+    decision = "retrain" if previous.scaler is None else "wait"
+    if previous.scaler is not None and len(new_rows):
+        report = drift_report(state, metrics.mean_absolute_error(new_rows['aqi'], previous.predict(new_rows)), new_rows)
+        print("Drift report:", report)
+        decision = incremental_decision(state, report)
+    print(f"Incremental decision: {decision} ({len(new_rows)} new rows since {state['trained_through']})")
+
+    if decision in ("wait", "skip"):
+        # Nothing is registered, so the new rows are checked again (with the next ones) next run
+        sys.exit(0)
+    if decision == "retrain":
+        print("Incremental training: falling back to a full retrain")
+
+    if decision == "update":
+        # New trees are fit on the new rows only, scaled with the stored scaler
+        x_new = previous.scaler.transform(new_rows[FEATURE_COLUMNS])
+        x_new_train, x_new_test, y_new_train, y_new_test = train_test_split(
+            x_new, new_rows['aqi'], test_size=0.2, train_size=0.8, random_state=42
+        )
+        added_trees = trees_to_add(state, len(new_rows))
+        with timed_stage("warm_start"):
+            model = previous.model
+            model.set_params(n_jobs=TRAIN_N_JOBS)
+            warm_start_forest(model, x_new_train, y_new_train, added_trees)
+
+        update_prediction = model.predict(x_new_test)
+        mae = metrics.mean_absolute_error(y_new_test, update_prediction)
+        mse = metrics.mean_squared_error(y_new_test, update_prediction)
+        r2 = metrics.r2_score(y_new_test, update_prediction)
+        print(f"Added {added_trees} trees ({len(model.estimators_)} total); MAE on new holdout rows: {mae}")
+
+        # The MAE baseline stays the full training run's holdout MAE
+        metadata = dict(
+            previous.metadata,
+            incremental_updates=previous.metadata.get("incremental_updates", 0) + 1,
+            training_state=training_state(data, state['mae'], len(model.estimators_)),
+        )
+        save_and_register(
+            InferenceArtifact(model, FEATURE_COLUMNS, previous.scaler, metadata),
+            {"mae": mae, "rmse": float(np.sqrt(mse)), "r2": r2},
+            f"Random Forest Model for predicting AQI (incremental update, {len(new_rows)} new rows)."
+        )
+        print("Stage wall times (s):", {name: round(seconds, 2) for name, seconds in stage_times.items()})
+        sys.exit(0)
+
+
+# -----------------------------------------------------------------------------------------------------------
+# -------------------------------------------  Full Training  -----------------------------------------------
+# -----------------------------------------------------------------------------------------------------------
+
+# features (x) and target (y), in the column order serving builds
+features = data[FEATURE_COLUMNS]
+target = data['aqi']
 
 # Feature Scaling
 from sklearn.preprocessing import StandardScaler
@@ -51,91 +156,102 @@ x = scaler.fit_transform(features)
 
 y = target
 
-# Features Importance
-from sklearn.ensemble import ExtraTreesRegressor
-model = ExtraTreesRegressor()
-model.fit(x,y)
-print(model.feature_importances_)
-
 # Train Test Split
-from sklearn.model_selection import train_test_split
 x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, train_size=0.8, random_state=42)
 
-# Random Forest
-from sklearn.ensemble import RandomForestRegressor
-rf=RandomForestRegressor()
-rf.fit(x_train,y_train)
+# Fold splits computed once and shared by the importance, CV and search stages
+from sklearn.model_selection import KFold
+folds = list(KFold(n_splits=TRAIN_CV_FOLDS, shuffle=True, random_state=42).split(x_train))
 
-# Model Evaluation
-print("R-Squared on train set: {}".format(rf.score(x_train, y_train)))
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.model_selection import cross_val_score, cross_validate
 
-from sklearn.model_selection import cross_val_score
-score=cross_val_score(rf,x,y,cv=5)
-score.mean()
+# Candidates and folds run in parallel, so each forest itself stays single-threaded
+with parallel_backend(TRAIN_BACKEND, n_jobs=TRAIN_N_JOBS):
 
-# Hyper Parameter Tuning
-from sklearn.model_selection import RandomizedSearchCV
+    # Features Importance, averaged over the shared folds
+    with timed_stage("feature_importance"):
+        importance = cross_validate(ExtraTreesRegressor(), x_train, y_train, cv=folds, return_estimator=True, n_jobs=TRAIN_N_JOBS)
+        print(np.mean([estimator.feature_importances_ for estimator in importance["estimator"]], axis=0))
 
-n_estimators = [int(x) for x in np.linspace(start = 100, stop = 1200, num = 12)]
-print(n_estimators)
+    # Random Forest
+    with timed_stage("fit"):
+        rf=RandomForestRegressor()
+        rf.fit(x_train,y_train)
 
-# Number of trees in random forest
-n_estimators = [int(x) for x in np.linspace(start = 100, stop = 1200, num = 12)]
+    # Model Evaluation
+    print("R-Squared on train set: {}".format(rf.score(x_train, y_train)))
 
-# Number of features to consider at every split
-max_features = ['auto', 'sqrt']
+    with timed_stage("cross_validation"):
+        score=cross_val_score(rf,x_train,y_train,cv=folds,n_jobs=TRAIN_N_JOBS)
+        print("CV R-Squared: {}".format(score.mean()))
 
-# Maximum number of levels in tree
-max_depth = [int(x) for x in np.linspace(5, 30, num = 6)]
+    # Hyper Parameter Tuning
+    from sklearn.model_selection import RandomizedSearchCV
 
-# Minimum number of samples required to split a node
-min_samples_split = [2, 5, 10, 15, 100]
+    # Number of trees in random forest
+    n_estimators = [int(x) for x in np.linspace(start = 100, stop = 1200, num = 12)]
 
-# Minimum number of samples required at each leaf node
-min_samples_leaf = [1, 2, 5, 10]
+    # Number of features to consider at every split ('auto' was removed from scikit-learn; 1.0 is its regressor equivalent)
+    max_features = [1.0, 'sqrt']
 
-# Create the random grid
-random_grid = {'n_estimators': n_estimators,
-               'max_features': max_features,
-               'max_depth': max_depth,
-               'min_samples_split': min_samples_split,
-               'min_samples_leaf': min_samples_leaf}
+    # Maximum number of levels in tree
+    max_depth = [int(x) for x in np.linspace(5, 30, num = 6)]
 
-print(random_grid)
-print(n_estimators)
+    # Minimum number of samples required to split a node
+    min_samples_split = [2, 5, 10, 15, 100]
 
-# Random search of parameters, using 3 fold cross validation, search across 100 different combinations
-rf_random = RandomizedSearchCV(estimator = rf, param_distributions = random_grid,scoring='neg_mean_squared_error', n_iter = 10, cv = 5, verbose=2, random_state=42, n_jobs = 1)
-rf_random.fit(x_train,y_train)
-print(rf_random.best_score_)
+    # Minimum number of samples required at each leaf node
+    min_samples_leaf = [1, 2, 5, 10]
 
-# Evaluation Metrics
+    # Create the random grid
+    random_grid = {'n_estimators': n_estimators,
+                   'max_features': max_features,
+                   'max_depth': max_depth,
+                   'min_samples_split': min_samples_split,
+                   'min_samples_leaf': min_samples_leaf}
 
-rf_prediction=rf.predict(x_test)
+    print(random_grid)
 
-from sklearn import metrics
-print('MAE:', metrics.mean_absolute_error(y_test, rf_prediction))
-print('MSE:', metrics.mean_squared_error(y_test, rf_prediction))
-print('RMSE:', np.sqrt(metrics.mean_squared_error(y_test, rf_prediction)))
-print('R^2:', metrics.r2_score(y_test, rf_prediction))
-
-# Example for saving a trained scikit-learn model
-import joblib
-joblib.dump(rf, "rf_model.pkl")
-
-# Access the Model Registry
-mr = project.get_model_registry()
-
-# Register your model in the Model Registry
-model_name = "random_forest"  
-description = "Random Forest Model for predicting AQI." 
-
-# Create a new model entry
-model = mr.python.create_model(
-        name=model_name,
-        description=description
-)
+    with timed_stage("search"):
+        if TRAIN_SEARCH == "halving":
+            # Successive halving: every candidate starts with few trees and only the best get more
+            from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+            from sklearn.model_selection import HalvingRandomSearchCV
+
+            halving_grid = {key: value for key, value in random_grid.items() if key != 'n_estimators'}
+            rf_random = HalvingRandomSearchCV(estimator = rf, param_distributions = halving_grid, resource = 'n_estimators',
+                                              min_resources = min(n_estimators), max_resources = max(n_estimators), factor = 3,
+                                              scoring='neg_mean_squared_error', cv = folds, verbose=2, random_state=42, n_jobs = TRAIN_N_JOBS)
+        else:
+            # Random search of parameters over the shared folds, search across TRAIN_SEARCH_ITER different combinations
+            rf_random = RandomizedSearchCV(estimator = rf, param_distributions = random_grid,scoring='neg_mean_squared_error', n_iter = TRAIN_SEARCH_ITER, cv = folds, verbose=2, random_state=42, n_jobs = TRAIN_N_JOBS)
+        rf_random.fit(x_train,y_train)
+    print(rf_random.best_params_)
+    print(rf_random.best_score_)
+
+print("Stage wall times (s):", {name: round(seconds, 2) for name, seconds in stage_times.items()})
+
+# The search refits its best configuration on the training set; that is the model we ship
+best_model = rf_random.best_estimator_
+
+# Evaluation Metrics
 
-# Save the model file to the Model Registry
-model_path = "rf_model.pkl" 
-model.save(model_path)
\ No newline at end of file
+rf_prediction=best_model.predict(x_test)
+
+mae = metrics.mean_absolute_error(y_test, rf_prediction)
+mse = metrics.mean_squared_error(y_test, rf_prediction)
+r2 = metrics.r2_score(y_test, rf_prediction)
+print('MAE:', mae)
+print('MSE:', mse)
+print('RMSE:', np.sqrt(mse))
+print('R^2:', r2)
+
+# Single inference artifact: scaler + tuned model + feature column order + schema hash,
+# with what it was trained on as the reference point for the next incremental run
+metadata = {
+    "best_params": rf_random.best_params_,
+    "training_state": training_state(data, mae, len(best_model.estimators_)),
+}
+artifact = InferenceArtifact(best_model, FEATURE_COLUMNS, scaler, metadata=metadata)
+save_and_register(artifact, {"mae": mae, "rmse": float(np.sqrt(mse)), "r2": r2}, "Random Forest Model for predicting AQI.")
@@ -1,163 +1,422 @@
 import os
-import requests
-from datetime import datetime
+import sys
+
+# Shared feature construction lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import startup
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import httpx
 import pandas as pd
-import hopsworks
-import joblib
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import numpy as np
+from backtest import backtest_lines, backtest_range
+from features import MAX_FORECAST_DAYS, assemble_forecast, build_feature_frame, feature_matrix
+from instrumentation import describe, prometheus_text, timed
+from model_cache import ModelCache
+from forecast_store import ForecastStore
+from memory_report import memory_report
+from prediction_batcher import PREDICT_BATCHING, PredictionBatcher
+from ttl_cache import TTLCache
+from server_timing import add_server_timing, stage
+
+startup.mark("imports")
 
-app = FastAPI()
+describe("http_request_duration_seconds", "Request latency by route, including cache hits")
+describe("predict_stage_seconds", "Time spent in fetch, features and predict stages of a forecast")
+describe("upstream_request_seconds", "Latency of OpenWeather (pollution) and Open-Meteo (weather) calls")
+describe("fetch_and_predict_seconds", "End-to-end forecast computation for one location")
+describe("model_load_seconds", "Registry lookup, download and deserialization of a model version")
+describe("predict_batch_seconds", "One micro-batched model.predict over the rows of concurrent requests")
+describe("predict_batch_requests_total", "Requests served by micro-batched predicts")
 
 # Pydantic model for the response data
 class AQIPredictionResponse(BaseModel):
     day: int
     predicted_aqi: float
 
+# Pydantic models for batch prediction requests
+class Location(BaseModel):
+    latitude: float
+    longitude: float
+
+class BatchPredictionRequest(BaseModel):
+    locations: list[Location]
+    days: int = 3
+    resolution: str = "daily"
+
 # URLs for data
-URL_POLLUTION_FORECAST = "http://api.openweathermap.org/data/2.5/air_pollution/forecast"
-URL_WEATHER_FORECAST = "https://api.open-meteo.com/v1/forecast"
+URL_POLLUTION_FORECAST = os.getenv("URL_POLLUTION_FORECAST", "http://api.openweathermap.org/data/2.5/air_pollution/forecast")
+URL_WEATHER_FORECAST = os.getenv("URL_WEATHER_FORECAST", "https://api.open-meteo.com/v1/forecast")
 
 # Fetch API keys from environment variables
 API_KEY = os.getenv("OPEN_WEATHER_API")
-hopsworks_api_key = os.getenv("HOPSWORKS_API_KEY")
 
 # Location
 LATITUDE = 24.8607
 LONGITUDE = 67.0011
 
+# Model served by /predict
+MODEL_NAME = "random_forest"
+
+# Process-wide model cache over the configured store's model registry, warmed in the
+# background at startup so the server accepts requests (and /health answers) right away
+model_cache = ModelCache()
+model_warm_error = None
+
+# Worker processes serving the app, set by serve.py (see /memory)
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", 1))
+
+# Upstream forecasts change at most hourly, so both the raw payloads and the
+# final predictions are cached for a while
+FORECAST_TTL_SECONDS = int(os.getenv("FORECAST_TTL_SECONDS", 900))
+PREDICTION_TTL_SECONDS = int(os.getenv("PREDICTION_TTL_SECONDS", 900))
+forecast_cache = TTLCache(ttl_seconds=FORECAST_TTL_SECONDS)
+prediction_cache = TTLCache(ttl_seconds=PREDICTION_TTL_SECONDS)
+
+# Forecasts precomputed by the forecast_data.py job; /predict reads them and only
+# computes on demand (writing the result back) when the stored entry is missing or stale
+forecast_store = ForecastStore()
+
+# Concurrent /predict computations share model.predict calls (PREDICT_BATCHING=0 disables)
+prediction_batcher = PredictionBatcher()
+
+# Batch predictions fetch upstream forecasts concurrently
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 16))
+MAX_BATCH_LOCATIONS = int(os.getenv("MAX_BATCH_LOCATIONS", 100))
+
+# Shared keep-alive HTTP client for the upstream APIs, created in the lifespan
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 10))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+http_client = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+    )
+    threading.Thread(target=warm_model_cache, name="warm-model", daemon=True).start()
+    if PREDICT_BATCHING:
+        prediction_batcher.start()
+    startup.mark("serving")
+    startup.print_report()
+    yield
+    await prediction_batcher.stop()
+    model_cache.stop()
+    await http_client.aclose()
+
+def warm_model_cache():
+    global model_warm_error
+    try:
+        model_cache.load(MODEL_NAME)
+        startup.mark("model_ready")
+        startup.print_report()
+        print_memory_report()
+    except Exception as e:
+        # The first request retries the load
+        model_warm_error = str(e)
+        print(f"Error warming model cache: {e}")
+    model_cache.start_refresh(MODEL_NAME)
+
+def model_memory_dir():
+    # Directory whose memory-mapped files hold the served model, if any
+    path = model_cache.current_path(MODEL_NAME)
+    return path if path is not None and os.path.isdir(path) else None
+
+def print_memory_report():
+    process = memory_report(model_memory_dir())["processes"][0]
+    print(f"Worker {process['pid']} memory (MB):", ", ".join(
+        f"{name[:-3]}={value}" for name, value in process.items() if name != "pid"
+    ))
+
+def model_status():
+    version = model_cache.current_version(MODEL_NAME)
+    if version is not None:
+        return {"state": "ready", "version": version}
+    if model_warm_error is not None:
+        return {"state": "error", "error": model_warm_error}
+    return {"state": "loading"}
+
+app = FastAPI(lifespan=lifespan)
+add_server_timing(app)
+
+async def fetch_forecast(url, params, upstream):
+    with timed("upstream_request_seconds", upstream=upstream):
+        response = await http_client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+async def fetch_pollution_forecast(latitude, longitude):
+    params_pollution = {
+        "lat": latitude,
+        "lon": longitude,
+        "appid": API_KEY
+    }
+    return await forecast_cache.aget_or_compute(
+        ("pollution", latitude, longitude),
+        lambda: fetch_forecast(URL_POLLUTION_FORECAST, params_pollution, "pollution")
+    )
+
+async def fetch_weather_forecast(latitude, longitude):
+    params_weather = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
+        # Pollution readings are bucketed by UTC date, so the weather days are requested in GMT
+        "timezone": "GMT"
+    }
+    return await forecast_cache.aget_or_compute(
+        ("weather", latitude, longitude),
+        lambda: fetch_forecast(URL_WEATHER_FORECAST, params_weather, "weather")
+    )
+
+# Pollution and weather forecasts are fetched concurrently
+async def fetch_forecast_payloads(latitude, longitude):
+    return await asyncio.gather(
+        fetch_pollution_forecast(latitude, longitude),
+        fetch_weather_forecast(latitude, longitude)
+    )
+
 # def fetch_and_predict_aqi_data(day_count, model_name):
-def fetch_and_predict_aqi_data(day_count, model_name, latitude, longitude):
+# Returns the model version used and the forecast frame (empty on errors)
+async def fetch_and_predict_aqi_data(day_count, model_name, latitude, longitude, resolution="daily"):
+    with timed("fetch_and_predict_seconds", resolution=resolution):
+        return await _fetch_and_predict_aqi_data(day_count, model_name, latitude, longitude, resolution)
 
+async def _fetch_and_predict_aqi_data(day_count, model_name, latitude, longitude, resolution):
     try:
-        # Initialize Hopsworks Feature Store and Model Registry
-        project = hopsworks.login(api_key_value="hopsworks_api_key")
-        mr = project.get_model_registry()
-
-        # Fetch all models with the specified name and get the latest version
-        models = mr.get_models(name=model_name)
-        latest_model = max(models, key=lambda m: m.version)  # Get the latest version
-        model_version = latest_model.version
+        # Latest model version from the in-memory cache (a cold cache loads off the event loop)
+        model_version, model = await asyncio.to_thread(model_cache.get, model_name)
         print(f"Using model version {model_version}")
 
-        # Load the trained model from Model Registry
-        model_dir = mr.get_model(model_name, version=model_version).download()
-        model = joblib.load(f"{model_dir}/rf_model.pkl")
+        # Concurrent misses for the same key share a single computation
+        forecast_df = await prediction_cache.aget_or_compute(
+            (latitude, longitude, day_count, resolution, model_version),
+            lambda: predict_aqi_forecast(day_count, model, latitude, longitude, resolution)
+        )
+        return model_version, forecast_df
 
-        # Forecast URLs and Parameters
-        params_pollution = {
-            "lat": LATITUDE,
-            "lon": LONGITUDE,
-            "appid": API_KEY
-        }
-        
-        params_weather = {
-            "latitude": LATITUDE,
-            "longitude": LONGITUDE,
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
-            "timezone": "Asia/Karachi"
-        }
+    except Exception as e:
+        print(f"Error: {e}")
+        return None, pd.DataFrame()
 
-        # Fetch forecast data
-        response_pollution = requests.get(URL_POLLUTION_FORECAST, params=params_pollution)
-        response_pollution.raise_for_status()
-        air_data = response_pollution.json()
+async def predict_aqi_forecast(day_count, model, latitude, longitude, resolution="daily"):
+    with stage("fetch"):
+        air_data, weather_data = await fetch_forecast_payloads(latitude, longitude)
 
-        response_weather = requests.get(URL_WEATHER_FORECAST, params=params_weather)
-        response_weather.raise_for_status()
-        weather_data = response_weather.json()
+    # Feature assembly is CPU-bound, so it runs off the event loop; predict goes through
+    # the batcher, which serves concurrent requests with one model.predict call
+    forecast_df, features_df = await asyncio.to_thread(
+        forecast_features, air_data, weather_data, day_count, latitude, longitude, resolution
+    )
+    with stage("predict"):
+        forecast_df["predicted_aqi"] = await prediction_batcher.predict(model, features_df)
+    forecast_df = await asyncio.to_thread(save_forecast_frame, forecast_df)
+    # The frame may be served from prediction_cache later, so it carries its compute time
+    forecast_df.attrs["computed_at"] = time.time()
+    return forecast_df
 
-        # Process forecast data
-        data_rows = []
-        previous_aqi = None
+def build_forecast_features(air_data, weather_data, day_count, latitude, longitude, resolution="daily"):
+    if "list" not in air_data or not air_data["list"]:
+        raise ValueError("No air pollution forecast data.")
 
-        for i in range(1, day_count + 1):
-            if "list" not in air_data or not air_data["list"]:
-                print(f"No air pollution forecast data for day {i}")
+    # Hourly pollution forecast aligned to the daily weather
+    days, day_offset = assemble_forecast(air_data["list"], weather_data["daily"], day_count, resolution)
+    forecast_df = build_feature_frame(days, latitude, longitude, day_offset)
+    if forecast_df.empty:
+        raise ValueError("No forecast data to process.")
+    return forecast_df
+
+def forecast_features(air_data, weather_data, day_count, latitude, longitude, resolution="daily"):
+    with stage("features"):
+        forecast_df = build_forecast_features(air_data, weather_data, day_count, latitude, longitude, resolution)
+        return forecast_df, feature_matrix(forecast_df)
+
+def save_forecast_frame(forecast_df):
+    # Save the forecast to a CSV
+    forecast_df.to_csv("forecast_data.csv", index=False)
+    print("AQI forecast saved successfully!")
+    return forecast_df[['readable_time', 'day_offset', 'predicted_aqi']]
+
+def validate_forecast_request(days, resolution):
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        return f"days must be between 1 and {MAX_FORECAST_DAYS}."
+    if resolution not in ("daily", "hourly"):
+        return "resolution must be 'daily' or 'hourly'."
+    return None
+
+async def predict_aqi_batch(locations, day_count, model_name, resolution="daily"):
+    model_version, model = await asyncio.to_thread(model_cache.get, model_name)
+
+    # Fetch every location's forecasts concurrently, recording per-location errors
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(location):
+        async with semaphore:
+            try:
+                return await fetch_forecast_payloads(location.latitude, location.longitude), None
+            except Exception as e:
+                return None, str(e)
+
+    with stage("fetch"):
+        fetched = await asyncio.gather(*(fetch(location) for location in locations))
+    results = await asyncio.to_thread(predict_batch_frames, locations, fetched, day_count, model, resolution)
+    return model_version, results
+
+def predict_batch_frames(locations, fetched, day_count, model, resolution="daily"):
+    built = []
+    with stage("features"):
+        for location, (payloads, error) in zip(locations, fetched):
+            if payloads is None:
+                built.append((None, error))
                 continue
-            
-            aqi = air_data["list"][0]["main"]["aqi"]
-            components = air_data["list"][0]["components"]
-            timestamp = air_data["list"][0]["dt"]
-            readable_time = datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')
-
-            # Compute AQI Change Rate
-            aqi_change_rate = 0 if previous_aqi is None else aqi - previous_aqi
-
-            # Extract Weather Data
-            max_temp = weather_data["daily"]["temperature_2m_max"][i - 1]
-            min_temp = weather_data["daily"]["temperature_2m_min"][i - 1]
-            precipitation = weather_data["daily"]["precipitation_sum"][i - 1]
-            wind_speed = weather_data["daily"]["windspeed_10m_max"][i - 1]
-
-            # Combine into a single row
-            row = {
-                "readable_time": readable_time,
-                "day_offset": i,
-                "hour": datetime.utcfromtimestamp(timestamp).hour,
-                "day": datetime.utcfromtimestamp(timestamp).day,
-                "month": datetime.utcfromtimestamp(timestamp).month,
-                "latitude": LATITUDE,
-                "longitude": LONGITUDE,
-                "aqi": aqi,  # This is the target column, not a feature
-                "aqi_change_rate": aqi_change_rate,
-                "co": components["co"],
-                "no": components["no"],
-                "no2": components["no2"],
-                "o3": components["o3"],
-                "so2": components["so2"],
-                "pm2_5": components["pm2_5"],
-                "pm10": components["pm10"],
-                "nh3": components["nh3"],
-                "max_temp": max_temp,
-                "min_temp": min_temp,
-                "precipitation": precipitation,
-                "max_wind_speed": wind_speed
-            }
-
-            data_rows.append(row)
-            previous_aqi = aqi
-
-        # Convert to DataFrame
-        forecast_df = pd.DataFrame(data_rows)
-
-        # Drop the 'aqi' column, as it is the target (not a feature)
-        features_df = forecast_df.drop(['readable_time', 'day_offset', 'latitude', 'longitude', 'aqi'], axis=1)
-
-        # Predict AQI using the trained model
-        if not features_df.empty:
-            predictions = model.predict(features_df)
-            forecast_df["predicted_aqi"] = predictions
-
-            # Save the forecast to a CSV
-            forecast_df.to_csv("forecast_data.csv", index=False)
-            print("AQI forecast saved successfully!")
-            return forecast_df[['day_offset', 'predicted_aqi']]
+            try:
+                forecast_df = build_forecast_features(*payloads, day_count, location.latitude, location.longitude, resolution)
+                built.append((forecast_df, None))
+            except Exception as e:
+                built.append((None, str(e)))
+
+    # One feature matrix and a single predict over all locations
+    succeeded = [i for i, (forecast_df, _) in enumerate(built) if forecast_df is not None]
+    by_location = {}
+    if succeeded:
+        batch_df = pd.concat([built[i][0] for i in succeeded], keys=succeeded, names=["location"])
+        batch_df = batch_df.reset_index(level=0)
+        with stage("predict"):
+            batch_df["predicted_aqi"] = model.predict(feature_matrix(batch_df))
+        by_location = dict(tuple(batch_df.groupby("location")))
 
+    results = []
+    for i, (location, (_, error)) in enumerate(zip(locations, built)):
+        result = {"latitude": location.latitude, "longitude": location.longitude}
+        if i in by_location:
+            predictions = by_location[i][['readable_time', 'day_offset', 'predicted_aqi']]
+            result["predictions"] = predictions.to_dict(orient="records")
         else:
-            print("No forecast data to process.")
-            return pd.DataFrame()
+            result["error"] = error
+        results.append(result)
 
-    except Exception as e:
-        print(f"Error: {e}")
-        return pd.DataFrame()
+    return results
 
 @app.get("/predict")
-def predict_aqi_api():
+async def predict_aqi_api(days: int = 3, resolution: str = "daily"):
     # forecast_df = fetch_and_predict_aqi_data(day_count=3, model_name="random_forest", latitude=LATITUDE, longitude=LONGITUDE)
-    
-    forecast_df = fetch_and_predict_aqi_data(
-        day_count=3,
-        model_name="random_forest",
-        latitude=LATITUDE,
-        longitude=LONGITUDE,
-        # api_key=API_KEY
-    )
+    error = validate_forecast_request(days, resolution)
+    if error:
+        return {"error": error}
+
+    with stage("store"):
+        entry = forecast_store.get(LATITUDE, LONGITUDE, resolution)
+    source = "store"
+
+    if not forecast_store.is_fresh(entry, model_cache.current_version(MODEL_NAME)):
+        # The full MAX_FORECAST_DAYS forecast is stored; shorter requests are a prefix of it
+        model_version, forecast_df = await fetch_and_predict_aqi_data(
+            day_count=MAX_FORECAST_DAYS,
+            model_name=MODEL_NAME,
+            latitude=LATITUDE,
+            longitude=LONGITUDE,
+            resolution=resolution,
+            # api_key=API_KEY
+        )
+
+        # Check if the forecast data is available
+        if forecast_df.empty:
+            return {"error": "No forecast data available for prediction."}
+        # Stored under the version that made the predictions, even if a newer model has
+        # been loaded since, so is_fresh doesn't take them for the new model's
+        entry = {
+            "model_version": model_version,
+            "computed_at": forecast_df.attrs["computed_at"],
+            "predictions": forecast_df[['readable_time', 'day_offset', 'predicted_aqi']].to_dict(orient="records"),
+        }
+        await asyncio.to_thread(
+            forecast_store.put, LATITUDE, LONGITUDE, resolution, entry["model_version"], entry["predictions"],
+            entry["computed_at"]
+        )
+        source = "computed"
+
+    predictions = [row for row in entry["predictions"] if row["day_offset"] <= days]
+    return {
+        "predictions": predictions,
+        "source": source,
+        "model_version": entry["model_version"],
+        "computed_at": datetime.fromtimestamp(entry["computed_at"], timezone.utc).isoformat(),
+        "age_seconds": round(time.time() - entry["computed_at"], 3),
+        "max_age_seconds": forecast_store.max_age_seconds,
+    }
 
-    # Check if the forecast data is available and return the result
-    if not forecast_df.empty:
-        predictions = forecast_df[['day_offset', 'predicted_aqi']].to_dict(orient="records")
-        return {"predictions": predictions}
-    else:
+@app.post("/predict/batch")
+async def predict_aqi_batch_api(request: BatchPredictionRequest):
+    error = validate_forecast_request(request.days, request.resolution)
+    if error:
+        return {"error": error}
+    if not 1 <= len(request.locations) <= MAX_BATCH_LOCATIONS:
+        return {"error": f"locations must contain between 1 and {MAX_BATCH_LOCATIONS} entries."}
+
+    try:
+        model_version, results = await predict_aqi_batch(request.locations, request.days, MODEL_NAME, request.resolution)
+    except Exception as e:
+        print(f"Error: {e}")
         return {"error": "No forecast data available for prediction."}
+    return {"model_version": model_version, "results": results}
+
+# Backtest of the served model over the stored feature rows in [start, end), streamed as
+# NDJSON: one line per prediction, then a line with MAE/RMSE per day of week and month.
+# Windows are read and predicted one at a time in a worker thread as the client reads
+@app.get("/backtest")
+async def backtest_api(start: str | None = None, end: str | None = None):
+    try:
+        start, end = backtest_range(start, end)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    try:
+        model_version, model = await asyncio.to_thread(model_cache.get, MODEL_NAME)
+    except Exception as e:
+        print(f"Error: {e}")
+        return {"error": "Model not available."}
+    return StreamingResponse(
+        backtest_lines(model_cache.store, model, start, end, model_version=model_version),
+        media_type="application/x-ndjson"
+    )
+
+# Liveness: answers as soon as the server is up, with model warm-up progress
+@app.get("/health")
+async def health_api():
+    return {"status": "ok", "model": model_status(), "startup_seconds": startup.report()}
+
+# Readiness: 503 until the model is loaded
+@app.get("/ready")
+async def ready_api():
+    status = model_status()
+    return JSONResponse(status, status_code=200 if status["state"] == "ready" else 503)
+
+# Prometheus text exposition of the process's counters and histograms
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_api():
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+# Memory of this worker, or of every worker when serving with several, including how
+# much of the memory-mapped model each one has resident and its proportional share
+@app.get("/memory")
+async def memory_api():
+    report = await asyncio.to_thread(memory_report, model_memory_dir(), SERVING_WORKERS)
+    report["model"] = {**model_status(), "path": model_cache.current_path(MODEL_NAME)}
+    return report
+
+@app.get("/cache/stats")
+async def cache_stats_api():
+    return {
+        "forecast": forecast_cache.stats(),
+        "predictions": prediction_cache.stats(),
+        "batcher": prediction_batcher.stats()
+    }
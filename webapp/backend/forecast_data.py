@@ -1,166 +1,144 @@
-# Loads the model and features from the Feature Store
+# Precomputes AQI forecasts for every configured location with the latest model and
+# writes them to the forecast store that /predict reads. Meant to run on a schedule
+# (e.g. hourly, and after each training run):
+#   FORECAST_LOCATIONS="24.8607,67.0011;31.5204,74.3587" python webapp/backend/forecast_data.py
 
 import os
+import sys
+
+# Shared feature construction lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import startup
+
 import requests
-from datetime import datetime, timedelta, timezone
 import pandas as pd
-import hopsworks
-import joblib
+from model_cache import ModelCache
+from forecast_store import ForecastStore
+from features import MAX_FORECAST_DAYS, assemble_forecast, build_feature_frame, feature_matrix
+from instrumentation import print_summary_at_exit, timed
 
 # Forecast URLs
-URL_POLLUTION_FORECAST = "http://api.openweathermap.org/data/2.5/air_pollution/forecast"
-URL_WEATHER_FORECAST = "https://api.open-meteo.com/v1/forecast"
+URL_POLLUTION_FORECAST = os.getenv("URL_POLLUTION_FORECAST", "http://api.openweathermap.org/data/2.5/air_pollution/forecast")
+URL_WEATHER_FORECAST = os.getenv("URL_WEATHER_FORECAST", "https://api.open-meteo.com/v1/forecast")
 
 # Fetch API keys from environment variables
 API_KEY = os.getenv("OPEN_WEATHER_API")
-hopsworks_api_key = os.getenv("HOPSWORKS_API_KEY")
 
 # Location
 LATITUDE = 24.8607
 LONGITUDE = 67.0011
 
-# Initialize Hopsworks Feature Store and Model Registry
-project = hopsworks.login(api_key_value="hopsworks_api_key")
-fs = project.get_feature_store()
-mr = project.get_model_registry()
+# Locations to precompute, as "lat,lon;lat,lon"
+FORECAST_LOCATIONS = os.getenv("FORECAST_LOCATIONS", f"{LATITUDE},{LONGITUDE}")
+FORECAST_RESOLUTIONS = ["daily", "hourly"]
 
-# Load the trained model from Model Registry
+# Model used for the forecast, loaded from the Model Registry (cached on disk) when the script runs
 model_name = "random_forest"
-model_version = 1
-model_dir = mr.get_model(model_name, version=model_version).download()
-
-model = joblib.load(f"{model_dir}/rf_model.pkl")
 
 def fetch_forecast_data(url_pollution, params_pollution, url_weather, params_weather):
     try:
-        response_pollution = requests.get(url_pollution, params=params_pollution)
-        response_pollution.raise_for_status()
-        air_data = response_pollution.json()
-        print(f"======>pollution forecast: {air_data}")
-
-        response_weather = requests.get(url_weather, params=params_weather)
-        response_weather.raise_for_status()
-        weather_data = response_weather.json()
-        print(f"======>weather forecast: {weather_data}")
+        with timed("forecast_fetch_seconds", api="pollution"):
+            response_pollution = requests.get(url_pollution, params=params_pollution)
+            response_pollution.raise_for_status()
+            air_data = response_pollution.json()
+        print(f"Pollution forecast: {len(air_data.get('list', []))} readings")
+
+        with timed("forecast_fetch_seconds", api="weather"):
+            response_weather = requests.get(url_weather, params=params_weather)
+            response_weather.raise_for_status()
+            weather_data = response_weather.json()
+        print(f"Weather forecast: {len(weather_data.get('daily', {}).get('time', []))} days")
 
         return air_data, weather_data
     except requests.exceptions.RequestException as e:
         print(f"Error fetching forecast data: {e}")
         return None, None
 
-# Function to process forecast data
-def process_forecast_data(air_data, weather_data, day_offset, previous_aqi):
-    if "list" not in air_data or not air_data["list"]:
-        print(f"No air pollution forecast data for day {day_offset}")
-        return None, previous_aqi
-
-    # Extract Air Pollution Data
-    aqi = air_data["list"][0]["main"]["aqi"]
-    components = air_data["list"][0]["components"]
-    timestamp = air_data["list"][0]["dt"]
-    readable_time = datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')
-
-    # Compute AQI Change Rate
-    aqi_change_rate = 0 if previous_aqi is None else aqi - previous_aqi
-
-    # Compute additional features
-    hour = datetime.utcfromtimestamp(timestamp).hour
-    day = datetime.utcfromtimestamp(timestamp).day
-    month = datetime.utcfromtimestamp(timestamp).month
-
-    # Extract Weather Data
-    max_temp = weather_data["daily"]["temperature_2m_max"][day_offset - 1]
-    min_temp = weather_data["daily"]["temperature_2m_min"][day_offset - 1]
-    precipitation = weather_data["daily"]["precipitation_sum"][day_offset - 1]
-    wind_speed = weather_data["daily"]["windspeed_10m_max"][day_offset - 1]
-
-    # Compute additional features
-    hour = datetime.utcfromtimestamp(timestamp).hour
-    day = datetime.utcfromtimestamp(timestamp).day
-    month = datetime.utcfromtimestamp(timestamp).month
-
-    # Combine into a single row
-    row = {
-        "readable_time": readable_time,
-        "day_offset": day_offset,
-        "hour": hour,
-        "day": day,
-        "month": month,
-        "latitude": LATITUDE,
-        "longitude": LONGITUDE,
-        "aqi": aqi,
-        "aqi_change_rate": aqi_change_rate,
-        "co": components["co"],
-        "no": components["no"],
-        "no2": components["no2"],
-        "o3": components["o3"],
-        "so2": components["so2"],
-        "pm2_5": components["pm2_5"],
-        "pm10": components["pm10"],
-        "nh3": components["nh3"],
-        "max_temp": max_temp,
-        "min_temp": min_temp,
-        "precipitation": precipitation,
-        "max_wind_speed": wind_speed
-    }
-
-    return row, aqi
-
-# Function to fetch and prepare forecast data
-def fetch_forecast_aqi_data(day_count):
-    data_rows = []
-    previous_aqi = None
+def parse_locations(value):
+    locations = []
+    for pair in value.split(";"):
+        if pair.strip():
+            latitude, longitude = pair.split(",")
+            locations.append((float(latitude), float(longitude)))
+    return locations
 
+# Function to fetch the raw forecasts for one location
+def fetch_location_forecast(latitude, longitude):
     # API Parameters
     params_pollution = {
-        "lat": LATITUDE,
-        "lon": LONGITUDE,
+        "lat": latitude,
+        "lon": longitude,
         "appid": API_KEY
     }
     params_weather = {
-        "latitude": LATITUDE,
-        "longitude": LONGITUDE,
+        "latitude": latitude,
+        "longitude": longitude,
         "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
-        "timezone": "Asia/Karachi"
+        # Pollution readings are bucketed by UTC date, so the weather days are requested in GMT
+        "timezone": "GMT"
     }
+    return fetch_forecast_data(URL_POLLUTION_FORECAST, params_pollution, URL_WEATHER_FORECAST, params_weather)
 
-    # Fetch forecast data
-    air_data, weather_data = fetch_forecast_data(URL_POLLUTION_FORECAST, params_pollution, URL_WEATHER_FORECAST, params_weather)
+# Function to fetch and prepare forecast data
+def fetch_forecast_aqi_data(day_count, latitude=LATITUDE, longitude=LONGITUDE, resolution="daily", payloads=None):
+    # Fetch forecast data (or reuse payloads already fetched for this location)
+    air_data, weather_data = payloads or fetch_location_forecast(latitude, longitude)
 
-    if air_data and weather_data and "daily" in weather_data and len(weather_data["daily"]["time"]) >= day_count:
-        for i in range(1, day_count + 1):
-            row, previous_aqi = process_forecast_data(air_data, weather_data, i, previous_aqi)
-            if row:
-                data_rows.append(row)
-    else:
+    if not (air_data and weather_data and "daily" in weather_data and len(weather_data["daily"]["time"]) >= day_count):
         print("Insufficient forecast data.")
+        return pd.DataFrame()
+    if "list" not in air_data or not air_data["list"]:
+        print("No air pollution forecast data.")
+        return pd.DataFrame()
 
-    # Return DataFrame
-    if data_rows:
-        return pd.DataFrame(data_rows)
+    # One row per day (or every hourly reading) of the pollution forecast aligned to each day's weather
+    days, day_offset = assemble_forecast(air_data["list"], weather_data["daily"], day_count, resolution)
+    return build_feature_frame(days, latitude, longitude, day_offset)
+
+# Computes the full MAX_FORECAST_DAYS forecast at every resolution for each location
+# (one upstream fetch per location) and stores it; returns the number of entries written
+def precompute_forecasts(store, locations, model_version, model):
+    written = 0
+    for latitude, longitude in locations:
+        payloads = fetch_location_forecast(latitude, longitude)
+        for resolution in FORECAST_RESOLUTIONS:
+            forecast_df = fetch_forecast_aqi_data(MAX_FORECAST_DAYS, latitude, longitude, resolution, payloads)
+            if forecast_df.empty:
+                print(f"No forecast for {latitude},{longitude} ({resolution})")
+                continue
+            try:
+                with timed("forecast_predict_seconds"):
+                    forecast_df["predicted_aqi"] = model.predict(feature_matrix(forecast_df))
+            except Exception as e:
+                print(f"Error during AQI prediction for {latitude},{longitude}: {e}")
+                continue
+            predictions = forecast_df[['readable_time', 'day_offset', 'predicted_aqi']].to_dict(orient="records")
+            store.put(latitude, longitude, resolution, model_version, predictions)
+            written += 1
+    return written
+
+# Main Execution: nothing is downloaded or fetched on import
+if __name__ == "__main__":
+    print_summary_at_exit("forecast_data")
+    locations = parse_locations(FORECAST_LOCATIONS)
+
+    # Load the latest inference artifact from the Model Registry (cached on disk)
+    model_version, model = ModelCache().load(model_name)
+
+    store = ForecastStore()
+    written = precompute_forecasts(store, locations, model_version, model)
+    print(f"{written} forecasts for {len(locations)} locations written to {store.path} (model version {model_version})")
+
+    # The default location's 3-day forecast is also kept as a CSV
+    entry = store.get(LATITUDE, LONGITUDE, "daily")
+    if entry is not None:
+        forecast_df = pd.DataFrame(entry["predictions"])
+        forecast_df = forecast_df[forecast_df["day_offset"] <= 3]
+        forecast_df.to_csv("forecast_aqi_data.csv", index=False)
+        print("3-Days AQI forecast saved successfully!")
+        print(forecast_df)
     else:
-        print("No valid forecast data found.")
-        return pd.DataFrame()
+        print("No forecast data to process.")
 
-# Predict AQI using Hopsworks Model Registry
-def predict_aqi(data):
-    try:
-        data = data.drop(['readable_time', 'day_offset', 'LATITUDE', 'longitude'], axis=1)
-        predictions = model.predict(data)
-        data["aqi"] = predictions
-        return data
-
-    except Exception as e:
-        print(f"Error during AQI prediction: {e}")
-        return data
-
-# Main Execution
-forecast_df = fetch_forecast_aqi_data(3)  # Fetch 3-day forecast data
-
-if not forecast_df.empty:
-    forecast_df = predict_aqi(forecast_df)
-    forecast_df.to_csv("forecast_aqi_data.csv", index=False)
-    print("3-Days AQI forecast saved successfully!")
-    print(forecast_df)
-else:
-    print("No forecast data to process.")
\ No newline at end of file
+    startup.mark("done")
+    startup.print_report()
\ No newline at end of file
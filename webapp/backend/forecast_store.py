@@ -0,0 +1,71 @@
+# Precomputed forecasts, written by the forecast_data.py job and read by /predict.
+# One row per (location, resolution) holding the full MAX_FORECAST_DAYS forecast as
+# JSON, with the model version and time it was computed; shorter requests are a
+# prefix of it. SQLite in WAL mode lets the job write while the server reads.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+FORECAST_STORE_PATH = os.getenv(
+    "FORECAST_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "forecast_store.db")
+)
+
+# Stored forecasts older than this are recomputed on demand
+FORECAST_MAX_AGE_SECONDS = int(os.getenv("FORECAST_MAX_AGE_SECONDS", 3600))
+
+# Coordinates are keyed at ~10 m precision so float noise doesn't miss an entry
+COORDINATE_DECIMALS = 4
+
+
+class ForecastStore:
+    def __init__(self, path=FORECAST_STORE_PATH, max_age_seconds=FORECAST_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._local = threading.local()  # one connection per thread
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts ("
+                "latitude REAL, longitude REAL, resolution TEXT, model_version INTEGER, "
+                "computed_at REAL, predictions TEXT, PRIMARY KEY (latitude, longitude, resolution))"
+            )
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _key(latitude, longitude, resolution):
+        return round(latitude, COORDINATE_DECIMALS), round(longitude, COORDINATE_DECIMALS), resolution
+
+    def put(self, latitude, longitude, resolution, model_version, predictions, computed_at=None):
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?)",
+                (*self._key(latitude, longitude, resolution), model_version,
+                 computed_at or time.time(), json.dumps(predictions))
+            )
+
+    def get(self, latitude, longitude, resolution):
+        row = self._connection().execute(
+            "SELECT model_version, computed_at, predictions FROM forecasts "
+            "WHERE latitude = ? AND longitude = ? AND resolution = ?",
+            self._key(latitude, longitude, resolution)
+        ).fetchone()
+        if row is None:
+            return None
+        model_version, computed_at, predictions = row
+        return {"model_version": model_version, "computed_at": computed_at, "predictions": json.loads(predictions)}
+
+    # Fresh while younger than max_age_seconds and made by the model being served (if known)
+    def is_fresh(self, entry, current_version=None):
+        if entry is None or time.time() - entry["computed_at"] > self.max_age_seconds:
+            return False
+        return current_version is None or entry["model_version"] == current_version
@@ -0,0 +1,104 @@
+# Per-process memory figures from /proc for the multi-worker server. RSS counts every
+# resident page a process maps, so pages shared between workers (the memory-mapped
+# model, shared libraries) are counted once per worker; PSS splits each shared page
+# between the processes mapping it, so the workers' PSS adds up to their real footprint.
+
+import os
+
+# smaps_rollup fields (kB) -> report keys (MB); shared and private are clean + dirty
+SMAPS_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_mb",
+    "Shared_Dirty": "shared_mb",
+    "Private_Clean": "private_mb",
+    "Private_Dirty": "private_mb",
+    "Swap": "swap_mb",
+}
+
+
+def process_memory(pid="self"):
+    # Totals over all of a process's mappings; empty where /proc/<pid>/smaps_rollup is unavailable
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in SMAPS_FIELDS:
+                    name = SMAPS_FIELDS[key]
+                    memory[name] = memory.get(name, 0) + int(value.split()[0])
+    except (OSError, ValueError):
+        return {}
+    return {name: round(kb / 1024, 1) for name, kb in memory.items()}
+
+
+def mapped_memory(directory, pid="self"):
+    # Resident (RSS) and proportional (PSS) size of a process's mappings of files under directory
+    prefix = os.path.realpath(directory) + os.sep
+    rss = pss = 0
+    in_directory = False
+    try:
+        with open(f"/proc/{pid}/smaps") as f:
+            for line in f:
+                fields = line.split()
+                if not fields[0].endswith(":"):
+                    # Mapping header: address perms offset dev inode [path]
+                    in_directory = len(fields) > 5 and " ".join(fields[5:]).startswith(prefix)
+                elif in_directory and fields[0] == "Rss:":
+                    rss += int(fields[1])
+                elif in_directory and fields[0] == "Pss:":
+                    pss += int(fields[1])
+    except (OSError, ValueError, IndexError):
+        return {}
+    return {"model_rss_mb": round(rss / 1024, 1), "model_pss_mb": round(pss / 1024, 1)}
+
+
+def directory_size_mb(directory):
+    size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+    return round(size / 1024 / 1024, 1)
+
+
+def worker_pids():
+    # Workers started by uvicorn --workers are spawned children of one supervisor process;
+    # its other children (e.g. the multiprocessing resource tracker) are left out
+    parent = os.getppid()
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == parent and b"spawn_main" in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def memory_report(model_dir=None, workers=1):
+    # This process, or every worker when serving with several; model_dir adds the
+    # memory of the mapped model files to each process
+    pids = worker_pids() if workers > 1 else []
+    if os.getpid() not in pids:
+        pids = sorted(pids + [os.getpid()])
+
+    processes = []
+    for pid in pids:
+        process = {"pid": pid, **process_memory(pid)}
+        if model_dir is not None:
+            process.update(mapped_memory(model_dir, pid))
+        processes.append(process)
+
+    report = {
+        "pid": os.getpid(),
+        "workers": len(processes),
+        "processes": processes,
+        "total_rss_mb": round(sum(p.get("rss_mb", 0) for p in processes), 1),
+        "total_pss_mb": round(sum(p.get("pss_mb", 0) for p in processes), 1),
+    }
+    if model_dir is not None:
+        report["model_files_mb"] = directory_size_mb(model_dir)
+    return report
@@ -0,0 +1,138 @@
+# Process-wide cache for models pulled from the model registry of the configured feature store.
+# Models are loaded once, kept in memory keyed by (model_name, version) and
+# refreshed in the background when a newer registry version appears.
+
+import fcntl
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Shared artifact and feature code lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from features import FEATURE_COLUMNS
+from inference_artifact import ARTIFACT_FILE, LEGACY_MODEL_FILE, load_artifact
+from forest_export import FOREST_DIR, export_forest, load_forest
+from feature_store import get_store
+from instrumentation import timed
+
+# Registry versions hold a compact forest export and/or a pickled inference artifact,
+# older ones a bare rf_model.pkl; the first one present is loaded
+MODEL_FILES = [FOREST_DIR, ARTIFACT_FILE, LEGACY_MODEL_FILE]
+
+# Downloaded artifacts are kept on disk so restarts don't re-fetch unchanged versions
+MODEL_CACHE_DIR = os.getenv(
+    "MODEL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cache")
+)
+
+# How often the background thread checks the registry for a newer version
+MODEL_REFRESH_SECONDS = int(os.getenv("MODEL_REFRESH_SECONDS", 300))
+
+# With several worker processes every one of them maps the same read-only forest files,
+# so the page cache holds a single copy of the trees. Versions registered as pickles are
+# exported to a forest in the cache directory once (by whichever worker gets there first)
+MODEL_SHARED_MMAP = os.getenv("MODEL_SHARED_MMAP", "1") == "1"
+
+
+class ModelCache:
+    def __init__(self, store=None, cache_dir=MODEL_CACHE_DIR, refresh_seconds=MODEL_REFRESH_SECONDS):
+        self.store = store or get_store()
+        self.cache_dir = cache_dir
+        self.refresh_seconds = refresh_seconds
+        self._models = {}  # (model_name, version) -> InferenceArtifact
+        self._current = {}  # model_name -> (version, InferenceArtifact)
+        self._paths = {}  # (model_name, version) -> file or directory the model was loaded from
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_artifact(self, model_name, version, model_dir):
+        for name in MODEL_FILES:
+            path = os.path.join(model_dir, name)
+            if not os.path.exists(path):
+                continue
+            if name == FOREST_DIR:
+                return load_forest(path, mmap=True, expected_columns=FEATURE_COLUMNS), path
+            if MODEL_SHARED_MMAP:
+                return self._load_shared_forest(model_name, version, path)
+            return load_artifact(path, expected_columns=FEATURE_COLUMNS), path
+        raise FileNotFoundError(f"No model file found in {model_dir}")
+
+    def _load_shared_forest(self, model_name, version, path):
+        forest_dir = os.path.join(self.cache_dir, model_name, f"{version}.{FOREST_DIR}")
+        if not os.path.isdir(forest_dir):
+            artifact = load_artifact(path, expected_columns=FEATURE_COLUMNS)
+            from sklearn.ensemble import RandomForestRegressor
+            if not isinstance(artifact.model, RandomForestRegressor):
+                # Only random forests have a flat export; other models stay per-process
+                return artifact, path
+
+            # Export next to the final location and rename it into place, so workers
+            # never map a half-written forest
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(forest_dir))
+            try:
+                export_forest(artifact, tmp_dir)
+                os.replace(tmp_dir, forest_dir)
+                print(f"Exported {model_name} version {version} to {forest_dir} for shared memory-mapping")
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return load_forest(forest_dir, mmap=True, expected_columns=FEATURE_COLUMNS), forest_dir
+
+    def _process_lock(self, model_name):
+        # Serializes downloads and exports across worker processes sharing the cache directory
+        os.makedirs(os.path.join(self.cache_dir, model_name), exist_ok=True)
+        lock_file = open(os.path.join(self.cache_dir, model_name, ".lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def load(self, model_name):
+        # Resolve the latest registry version, deserializing it only if it isn't in memory yet
+        with self._lock:
+            version = self.store.latest_model_version(model_name)
+            if (model_name, version) not in self._models:
+                print(f"Loading model {model_name} version {version} from {self.store}")
+                with timed("model_load_seconds", model=model_name), self._process_lock(model_name):
+                    model_dir = self.store.model_dir(model_name, version, self.cache_dir)
+                    artifact, path = self._load_artifact(model_name, version, model_dir)
+                    self._models[(model_name, version)] = artifact
+                    self._paths[(model_name, version)] = path
+
+                # Keep only the version being served
+                for key in [k for k in self._models if k[0] == model_name and k[1] != version]:
+                    del self._models[key]
+                    self._paths.pop(key, None)
+
+            self._current[model_name] = (version, self._models[(model_name, version)])
+            return self._current[model_name]
+
+    def get(self, model_name):
+        # Hot path: a single dict lookup, falling back to a load on a cold cache
+        current = self._current.get(model_name)
+        if current is None:
+            return self.load(model_name)
+        return current
+
+    def current_version(self, model_name):
+        # Version being served, or None before the first successful load
+        current = self._current.get(model_name)
+        return current[0] if current else None
+
+    def current_path(self, model_name):
+        # Forest directory (memory-mapped) or pickle the served version was loaded from
+        version = self.current_version(model_name)
+        return self._paths.get((model_name, version)) if version is not None else None
+
+    def start_refresh(self, model_name):
+        def refresh():
+            while not self._stop.wait(self.refresh_seconds):
+                try:
+                    self.load(model_name)
+                except Exception as e:
+                    print(f"Error refreshing model {model_name}: {e}")
+
+        self._thread = threading.Thread(target=refresh, name=f"refresh-{model_name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
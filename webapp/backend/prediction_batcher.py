@@ -0,0 +1,108 @@
+# Micro-batching for model.predict. Concurrent requests put their feature rows on a
+# queue; one task gathers them for up to max_wait_ms (or until max_batch_rows) and runs
+# a single vectorized predict per model in a worker thread, then hands each request its
+# slice of the result. While a batch is predicting the next one fills up, so batches
+# grow with load and a lone request waits at most max_wait_ms extra.
+
+import asyncio
+import os
+from contextlib import suppress
+import numpy as np
+import pandas as pd
+from instrumentation import count, timed
+
+PREDICT_BATCHING = os.getenv("PREDICT_BATCHING", "1") == "1"
+PREDICT_BATCH_MAX_ROWS = int(os.getenv("PREDICT_BATCH_MAX_ROWS", 1024))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", 1))
+
+
+class PredictionBatcher:
+    def __init__(self, max_batch_rows=PREDICT_BATCH_MAX_ROWS, max_wait_ms=PREDICT_BATCH_MAX_WAIT_MS):
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+
+    def start(self):
+        # Called from the running event loop (the app lifespan)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="prediction-batcher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def predict(self, model, features):
+        # Without a running batch task (not started, or stopped) predict directly
+        if self._task is None or self._task.done():
+            return await asyncio.to_thread(model.predict, features)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((model, features, future))
+        return await future
+
+    def _drain(self, batch, rows):
+        while rows < self.max_batch_rows and not self._queue.empty():
+            item = self._queue.get_nowait()
+            batch.append(item)
+            rows += len(item[1])
+        return rows
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        rows = self._drain(batch, len(batch[0][1]))
+        if rows < self.max_batch_rows and self.max_wait > 0:
+            await asyncio.sleep(self.max_wait)
+            self._drain(batch, rows)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Requests cancelled while queued (client gone) are dropped
+            batch = [item for item in batch if not item[2].done()]
+            by_model = {}
+            for model, features, future in batch:
+                by_model.setdefault(id(model), (model, []))[1].append((features, future))
+            for model, items in by_model.values():
+                await self._predict_batch(model, items)
+
+    async def _predict_batch(self, model, items):
+        frames = [features for features, _ in items]
+        try:
+            with timed("predict_batch_seconds"):
+                features = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                predictions = await asyncio.to_thread(model.predict, features)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.requests += len(items)
+        self.rows += len(features)
+        count("predict_batches_total")
+        count("predict_batch_requests_total", len(items))
+        count("predict_batch_rows_total", len(features))
+
+        offsets = np.cumsum([len(frame) for frame in frames])[:-1]
+        for (_, future), part in zip(items, np.split(np.asarray(predictions), offsets)):
+            if not future.done():
+                future.set_result(part)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "mean_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "mean_rows_per_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "max_batch_rows": self.max_batch_rows,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,33 @@
+# Runs the API with one or more worker processes:
+#   python webapp/backend/serve.py --workers 4 --port 8000
+# Each worker loads the model through the shared on-disk cache and memory-maps the same
+# read-only forest files (see MODEL_SHARED_MMAP in model_cache.py), so adding workers
+# adds their own interpreter and request state but not another copy of the trees.
+# Kept separate from app.py so the supervisor process doesn't import the app's
+# dependencies; GET /memory reports each worker's memory.
+
+import argparse
+import os
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the AQI prediction API.")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVING_WORKERS", 1)),
+                        help="worker processes (default: SERVING_WORKERS or 1)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Read by the workers for /memory
+    os.environ["SERVING_WORKERS"] = str(args.workers)
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=BACKEND_DIR, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
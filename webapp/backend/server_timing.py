@@ -0,0 +1,46 @@
+# Per-request stage timings, reported in the standard Server-Timing response header
+# (e.g. "fetch;dur=12.3, features;dur=4.1, predict;dur=8.0") and recorded as metrics
+# (predict_stage_seconds, http_request_duration_seconds, http_requests_total).
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from instrumentation import count, observe
+
+_timings = ContextVar("server_timings", default=None)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("predict_stage_seconds", elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed * 1000
+
+
+def add_server_timing(app):
+    # asyncio.to_thread copies the context, so stages timed in worker threads land in the same dict
+    @app.middleware("http")
+    async def server_timing_middleware(request, call_next):
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _timings.reset(token)
+        elapsed = time.perf_counter() - start
+        timings["total"] = elapsed * 1000
+
+        # Route templates keep the label set small
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        observe("http_request_duration_seconds", elapsed, path=path, method=request.method)
+        count("http_requests_total", path=path, method=request.method, status=response.status_code)
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={dur:.3f}" for name, dur in timings.items())
+        return response
@@ -0,0 +1,78 @@
+# Thread-safe TTL cache with single-flight loading: concurrent misses on the
+# same key wait for one computation instead of each calling the upstream.
+
+import asyncio
+import threading
+import time
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, value)
+        self._inflight = {}  # key -> asyncio.Task computing it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def aget_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+            task = self._inflight.get(key)
+            if task is None:
+                self.misses += 1
+                task = self._inflight[key] = asyncio.create_task(self._load(key, compute))
+                task.add_done_callback(self._retrieve)
+            else:
+                self.coalesced += 1
+
+        # The computation runs in its own task and every caller, the first included, awaits
+        # it shielded: a cancelled caller stops waiting without cancelling the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key, compute):
+        try:
+            value = await compute()
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._evict()
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    @staticmethod
+    def _retrieve(task):
+        # Marks the error retrieved when every caller was cancelled before it
+        if not task.cancelled():
+            task.exception()
+
+    def _evict(self):
+        # Drop expired entries first, then the oldest ones if still over capacity
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+            }